@@ -0,0 +1,344 @@
+import random
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from operator import add
+from path_engine import PathEngine
+
+# a betweenness source costs about a second per million edges
+BETWEENNESS_SAMPLE = 32
+# graph used by the worker processes, set by _init_worker
+_worker_graph = None
+
+
+def collaboration_graph(engine: PathEngine) -> tuple[array, array]:
+    """Collapses the engine's edges, one per shared track, into a simple
+    graph with one edge per collaborating pair, in the same CSR form
+
+    Args:
+        engine (PathEngine): The path engine
+
+    Returns:
+        tuple[array, array]: The offsets and neighbors of the simple graph
+    """
+    offsets = array("q", [0]) * (len(engine.artist_ids) + 1)
+    neighbors = array("i")
+    for artist in range(len(engine.artist_ids)):
+        start, end = engine.offsets[artist], engine.offsets[artist + 1]
+        collaborators = set(engine.neighbors[start:end])
+        collaborators.discard(artist)
+        neighbors.extend(sorted(collaborators))
+        offsets[artist + 1] = len(neighbors)
+    return offsets, neighbors
+
+
+def connected_components(offsets: array, neighbors: array) -> array:
+    """Labels the connected components with a union-find over the edges,
+    with union by size and path halving
+
+    Args:
+        offsets (array): The CSR offsets of a simple graph
+        neighbors (array): The CSR neighbors of a simple graph
+
+    Returns:
+        array: The component of each artist, numbered from the largest
+        component down
+    """
+    count = len(offsets) - 1
+    parents = array("i", range(count))
+    sizes = array("i", [1]) * count
+
+    def find(artist: int) -> int:
+        while parents[artist] != artist:
+            parents[artist] = parents[parents[artist]]
+            artist = parents[artist]
+        return artist
+
+    for artist in range(count):
+        for edge in range(offsets[artist], offsets[artist + 1]):
+            other = neighbors[edge]
+            # each pair is stored both ways, so union it once
+            if other < artist:
+                continue
+            first, second = find(artist), find(other)
+            if first == second:
+                continue
+            if sizes[first] < sizes[second]:
+                first, second = second, first
+            parents[second] = first
+            sizes[first] += sizes[second]
+
+    roots = [find(artist) for artist in range(count)]
+    ranked = sorted(set(roots), key=lambda root: (-sizes[root], root))
+    numbers = {root: i for i, root in enumerate(ranked)}
+    return array("i", (numbers[root] for root in roots))
+
+
+def _init_worker(offsets: array, neighbors: array) -> None:
+    """Keeps the simple graph in a worker process
+
+    Args:
+        offsets (array): The CSR offsets of a simple graph
+        neighbors (array): The CSR neighbors of a simple graph
+    """
+    global _worker_graph
+    _worker_graph = (offsets, neighbors)
+
+
+def _run_sources(sources: list) -> list[float]:
+    """Accumulates the dependencies from each source in a worker process
+
+    Args:
+        sources (list): Indexes of the source artists
+
+    Returns:
+        list[float]: The summed dependencies of each artist
+    """
+    return _dependencies(*_worker_graph, sources)
+
+
+def _dependencies(
+    offsets: array, neighbors: array, sources: list
+) -> list[float]:
+    """Runs Brandes' algorithm from each source artist, resetting only the
+    artists each BFS reached between sources
+
+    Args:
+        offsets (array): The CSR offsets of a simple graph
+        neighbors (array): The CSR neighbors of a simple graph
+        sources (list): Indexes of the source artists
+
+    Returns:
+        list[float]: The summed dependencies of each artist
+    """
+    count = len(offsets) - 1
+    centrality = [0.0] * count
+    distances = [-1] * count
+    paths = [0] * count
+    dependencies = [0.0] * count
+    for source in sources:
+        distances[source] = 0
+        paths[source] = 1
+        order = [source]
+        for artist in order:
+            depth = distances[artist] + 1
+            artist_paths = paths[artist]
+            for other in neighbors[offsets[artist] : offsets[artist + 1]]:
+                distance = distances[other]
+                if distance < 0:
+                    distances[other] = depth
+                    paths[other] = artist_paths
+                    order.append(other)
+                elif distance == depth:
+                    paths[other] += artist_paths
+        for artist in reversed(order):
+            depth = distances[artist] - 1
+            share = (1.0 + dependencies[artist]) / paths[artist]
+            for other in neighbors[offsets[artist] : offsets[artist + 1]]:
+                if distances[other] == depth:
+                    dependencies[other] += paths[other] * share
+            if artist != source:
+                centrality[artist] += dependencies[artist]
+        for artist in order:
+            distances[artist] = -1
+            paths[artist] = 0
+            dependencies[artist] = 0.0
+    return centrality
+
+
+def betweenness(
+    offsets: array,
+    neighbors: array,
+    sources: list,
+    workers: int = 1,
+    chunk_size: int = 4,
+) -> list[float]:
+    """Estimates betweenness centrality with Brandes' algorithm from a
+    sample of source artists, scaled up to every source, spread over a
+    process pool
+
+    Args:
+        offsets (array): The CSR offsets of a simple graph
+        neighbors (array): The CSR neighbors of a simple graph
+        sources (list): Indexes of the source artists
+        workers (int, optional): The number of processes. Defaults to 1.
+        chunk_size (int, optional): The number of sources per task.
+        Defaults to 4.
+
+    Returns:
+        list[float]: The estimated number of shortest paths between other
+        artists passing through each artist
+    """
+    count = len(offsets) - 1
+    if workers <= 1:
+        centrality = _dependencies(offsets, neighbors, sources)
+    else:
+        chunks = [
+            sources[i : i + chunk_size]
+            for i in range(0, len(sources), chunk_size)
+        ]
+        centrality = [0.0] * count
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(offsets, neighbors),
+        ) as executor:
+            for partial in executor.map(_run_sources, chunks):
+                centrality = list(map(add, centrality, partial))
+    # every pair is counted from both ends when all sources are used
+    scale = count / max(len(sources), 1) / 2
+    return [value * scale for value in centrality]
+
+
+def articulation_points(offsets: array, neighbors: array) -> dict[int, int]:
+    """Finds the artists whose removal splits their component, with an
+    iterative version of Tarjan's depth-first search so deep chains do not
+    hit the recursion limit
+
+    Args:
+        offsets (array): The CSR offsets of a simple graph
+        neighbors (array): The CSR neighbors of a simple graph
+
+    Returns:
+        dict[int, int]: The number of artists each articulation point
+        would cut off from the rest of its component, by artist index
+    """
+    count = len(offsets) - 1
+    discovered = array("i", [-1]) * count
+    low = array("i", [0]) * count
+    subtree = array("i", [0]) * count
+    separated = {}
+    clock = 0
+    for root in range(count):
+        if discovered[root] >= 0:
+            continue
+        discovered[root] = low[root] = clock
+        clock += 1
+        subtree[root] = 1
+        # sizes of the subtrees each artist's removal would split off
+        cuts = {}
+        # (artist, parent, position in its edge range)
+        stack = [(root, -1, offsets[root])]
+        while stack:
+            artist, parent, edge = stack[-1]
+            if edge < offsets[artist + 1]:
+                stack[-1] = (artist, parent, edge + 1)
+                other = neighbors[edge]
+                if discovered[other] < 0:
+                    discovered[other] = low[other] = clock
+                    clock += 1
+                    subtree[other] = 1
+                    stack.append((other, artist, offsets[other]))
+                elif other != parent:
+                    low[artist] = min(low[artist], discovered[other])
+                continue
+            stack.pop()
+            if parent < 0:
+                continue
+            low[parent] = min(low[parent], low[artist])
+            subtree[parent] += subtree[artist]
+            if low[artist] >= discovered[parent]:
+                cuts.setdefault(parent, []).append(subtree[artist])
+
+        size = subtree[root]
+        for artist, pieces in cuts.items():
+            if artist == root:
+                # the root only splits its component with two children
+                if len(pieces) < 2:
+                    continue
+            else:
+                pieces.append(size - 1 - sum(pieces))
+            separated[artist] = size - 1 - max(pieces)
+    return separated
+
+
+def analytics_report(
+    engine: PathEngine,
+    sample: int | None = BETWEENNESS_SAMPLE,
+    top: int = 10,
+    workers: int = 1,
+    seed: int = 0,
+) -> dict:
+    """Summarizes the structure of the collaboration graph: its connected
+    components and isolated artists, the distribution of collaborators per
+    artist, the biggest bridges by sampled betweenness centrality and the
+    articulation points
+
+    Args:
+        engine (PathEngine): The path engine
+        sample (int | None, optional): The number of betweenness sources
+        to sample. Defaults to BETWEENNESS_SAMPLE, and None uses every
+        artist.
+        top (int, optional): The number of artists listed per ranking and
+        of isolated artists listed. Defaults to 10.
+        workers (int, optional): The number of betweenness processes.
+        Defaults to 1.
+        seed (int, optional): The sampling seed. Defaults to 0.
+
+    Returns:
+        dict: The report
+    """
+    offsets, neighbors = collaboration_graph(engine)
+    count = len(engine.artist_ids)
+
+    def describe(artist: int, **fields) -> dict:
+        return {
+            "id": engine.artist_ids[artist],
+            "name": engine.artist_names[artist],
+            **fields,
+        }
+
+    degrees = array(
+        "i", (offsets[i + 1] - offsets[i] for i in range(count))
+    )
+    isolated = [artist for artist in range(count) if degrees[artist] == 0]
+    components = connected_components(offsets, neighbors)
+    sizes = Counter(components)
+
+    sources = list(range(count))
+    if sample is not None and sample < count:
+        sources = sorted(random.Random(seed).sample(sources, sample))
+    centrality = betweenness(offsets, neighbors, sources, workers)
+    cut = articulation_points(offsets, neighbors)
+
+    hubs = sorted(range(count), key=lambda i: -degrees[i])[:top]
+    bridges = sorted(range(count), key=lambda i: -centrality[i])[:top]
+    cut_points = sorted(cut, key=lambda i: (-cut[i], -degrees[i]))[:top]
+    return {
+        "artists": count,
+        "collaborations": len(neighbors) // 2,
+        "components": {
+            "count": len(sizes),
+            "largest": sizes[0] if sizes else 0,
+            "sizes": dict(
+                sorted(Counter(sizes.values()).items(), reverse=True)
+            ),
+        },
+        "isolated": {
+            "count": len(isolated),
+            "artists": [describe(artist) for artist in isolated[:top]],
+        },
+        "degrees": {
+            "mean": sum(degrees) / count if count else 0.0,
+            "max": max(degrees, default=0),
+            "histogram": dict(sorted(Counter(degrees).items())),
+            "top": [
+                describe(artist, collaborators=degrees[artist])
+                for artist in hubs
+            ],
+        },
+        "betweenness": {
+            "sources": len(sources),
+            "top": [
+                describe(artist, score=centrality[artist])
+                for artist in bridges
+            ],
+        },
+        "articulation_points": {
+            "count": len(cut),
+            "top": [
+                describe(artist, separates=cut[artist])
+                for artist in cut_points
+            ],
+        },
+    }
@@ -0,0 +1,234 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from file_utilities import read_artist_csv
+
+# str patterns are Unicode-aware, so non-Latin letters are kept
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_name(name: str) -> str:
+    """Normalizes an artist name for matching: accents are stripped, case
+    is folded, "&" reads as "and" and punctuation collapses to spaces.
+    Letters of any script are kept, so a name of only punctuation
+    normalizes to an empty string
+
+    Args:
+        name (str): The artist name
+
+    Returns:
+        str: The normalized name
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    # recompose what decomposition split apart besides accents, e.g. the
+    # jamo of Hangul syllables
+    recomposed = unicodedata.normalize("NFC", stripped)
+    folded = recomposed.casefold().replace("&", " and ")
+    return NON_WORD.sub(" ", folded).strip()
+
+
+def _trigrams(name: str) -> set[str]:
+    """Gets the character trigrams of a normalized name
+
+    Args:
+        name (str): The normalized name
+
+    Returns:
+        set[str]: The trigrams, padded at the ends
+    """
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class ArtistIndex:
+    """Local artist name resolution over the artists in the graph, with
+    exact, prefix and fuzzy matching and an LRU of recent lookups"""
+
+    def __init__(
+        self: "ArtistIndex",
+        artists: list,
+        cache_size: int = 4096,
+        fuzzy_cutoff: float = 0.75,
+    ) -> None:
+        self._artists = [
+            {"name": artist["name"], "id": artist["id"]} for artist in artists
+        ]
+        self._fuzzy_cutoff = fuzzy_cutoff
+        self._names = [normalize_name(a["name"]) for a in self._artists]
+        self._exact = {}
+        self._trigrams = {}
+        prefixes = []
+        for i, name in enumerate(self._names):
+            # names of only punctuation cannot be matched
+            if not name:
+                continue
+            self._exact.setdefault(name, []).append(i)
+            for trigram in _trigrams(name):
+                self._trigrams.setdefault(trigram, []).append(i)
+            # index every word start so "weeknd" completes "The Weeknd"
+            words = name.split(" ")
+            for w in range(len(words)):
+                prefixes.append((" ".join(words[w:]), i))
+        prefixes.sort()
+        self._prefix_keys = [key for key, _ in prefixes]
+        self._prefix_artists = [i for _, i in prefixes]
+        # keyed on the normalized name, so spelling variants share a slot
+        self._resolve_key = lru_cache(maxsize=cache_size)(self._best_match)
+
+    @classmethod
+    def from_csv(
+        cls: type["ArtistIndex"], path: str = "data/artists.csv"
+    ) -> "ArtistIndex":
+        """Builds the index from the artist CSV file
+
+        Args:
+            cls (type[ArtistIndex]): The ArtistIndex class
+            path (str, optional): The path to the artist file. Defaults to
+            "data/artists.csv".
+
+        Returns:
+            ArtistIndex: The index
+        """
+        return cls(read_artist_csv(path))
+
+    def __len__(self: "ArtistIndex") -> int:
+        return len(self._artists)
+
+    def resolve(self: "ArtistIndex", name: str) -> dict | None:
+        """Resolves a name to the best matching artist, exactly if possible
+        and fuzzily otherwise, through an LRU of recent normalized names
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            name (str): The artist name
+
+        Returns:
+            dict | None: A copy of the artist, or None if nothing matches
+            closely
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        i = self._resolve_key(key)
+        return None if i is None else dict(self._artists[i])
+
+    def _best_match(self: "ArtistIndex", key: str) -> int | None:
+        """Finds the best matching artist for a normalized name. Wrapped by
+        the resolve LRU
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            key (str): The normalized name
+
+        Returns:
+            int | None: Index of the artist, or None if nothing matches
+            closely
+        """
+        exact = self._exact.get(key)
+        if exact:
+            return exact[0]
+        fuzzy = self._fuzzy_matches(key, limit=1)
+        return fuzzy[0] if fuzzy else None
+
+    def exact(self: "ArtistIndex", name: str) -> list[dict]:
+        """Gets the artists whose normalized name equals the given one
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            name (str): The artist name
+
+        Returns:
+            list[dict]: Copies of the matching artists, in artist file order
+        """
+        key = normalize_name(name)
+        matches = self._exact.get(key, []) if key else []
+        return [dict(self._artists[i]) for i in matches]
+
+    def complete(self: "ArtistIndex", prefix: str, limit: int = 10) -> list:
+        """Autocompletes a partial name, matching the start of the name or
+        of any of its words. Matches on the start of the name rank first
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            prefix (str): The partial name
+            limit (int, optional): The maximum number of artists. Defaults
+            to 10.
+
+        Returns:
+            list: Copies of the matching artists
+        """
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        matches = []
+        start = bisect_left(self._prefix_keys, key)
+        for pos in range(start, len(self._prefix_keys)):
+            if not self._prefix_keys[pos].startswith(key):
+                break
+            matches.append(pos)
+        # whole-name prefixes first, then shorter names
+        matches.sort(
+            key=lambda pos: (
+                self._prefix_keys[pos]
+                != self._names[self._prefix_artists[pos]],
+                len(self._names[self._prefix_artists[pos]]),
+            )
+        )
+        results = []
+        seen = set()
+        for pos in matches:
+            i = self._prefix_artists[pos]
+            if i not in seen:
+                seen.add(i)
+                results.append(dict(self._artists[i]))
+                if len(results) == limit:
+                    break
+        return results
+
+    def fuzzy(self: "ArtistIndex", name: str, limit: int = 5) -> list[dict]:
+        """Finds the artists with names similar to the given one. Candidates
+        sharing the most trigrams with the name are ranked by similarity
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            name (str): The artist name
+            limit (int, optional): The maximum number of artists. Defaults
+            to 5.
+
+        Returns:
+            list[dict]: Copies of the artists above the similarity cutoff,
+            best first
+        """
+        matches = self._fuzzy_matches(normalize_name(name), limit)
+        return [dict(self._artists[i]) for i in matches]
+
+    def _fuzzy_matches(
+        self: "ArtistIndex", key: str, limit: int
+    ) -> list[int]:
+        """Ranks the artists similar to a normalized name
+
+        Args:
+            self (ArtistIndex): Instance of ArtistIndex
+            key (str): The normalized name
+            limit (int): The maximum number of artists
+
+        Returns:
+            list[int]: Indexes of the artists above the similarity cutoff,
+            best first
+        """
+        if not key:
+            return []
+        counts = Counter()
+        for trigram in _trigrams(key):
+            counts.update(self._trigrams.get(trigram, ()))
+        scored = []
+        for i, _ in counts.most_common(50):
+            ratio = SequenceMatcher(None, key, self._names[i]).ratio()
+            if ratio >= self._fuzzy_cutoff:
+                scored.append((-ratio, i))
+        scored.sort()
+        return [i for _, i in scored[:limit]]
@@ -0,0 +1,438 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from dotenv import load_dotenv
+from typing import Any
+from spotipy.exceptions import SpotifyException
+from metrics import metrics
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache, cache_key
+
+load_dotenv()
+
+logger = logging.getLogger()
+API_URL = "https://api.spotify.com/v1/"
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+MAX_RETRIES = 5
+MAX_CONNECTIONS = 100
+# refresh the access token this many seconds before it expires
+TOKEN_MARGIN = 60
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncSpotifyClient:
+    """Asynchronous counterpart of SpotifyClient with the same methods, for
+    keeping many requests in flight from one event loop.
+
+    Requests share one keep-alive connection pool and one client
+    credentials token, refreshed by a single request when it is about to
+    expire. Identical requests made while one is in flight wait for its
+    response instead of being sent again. Use it as an async context
+    manager so the connection pool is closed.
+    """
+
+    def __init__(
+        self: "AsyncSpotifyClient",
+        cache: ResponseCache | None = None,
+        limiter: RateLimiter | None = None,
+        max_retries: int = MAX_RETRIES,
+        max_connections: int = MAX_CONNECTIONS,
+        timeout: float = 30.0,
+    ) -> None:
+        self._client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        self._client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+        self._cache = cache
+        self._limiter = limiter
+        self._max_retries = max_retries
+        self._max_connections = max_connections
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = None
+        self._in_flight = {}
+
+    async def __aenter__(self: "AsyncSpotifyClient") -> "AsyncSpotifyClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self: "AsyncSpotifyClient") -> None:
+        """Opens the pooled HTTP session
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_connections, keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self._timeout
+            )
+            self._token_lock = asyncio.Lock()
+
+    async def close(self: "AsyncSpotifyClient") -> None:
+        """Closes the pooled HTTP session
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def cache_stats(self: "AsyncSpotifyClient") -> dict | None:
+        """Gets the response cache hit and miss counters
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+
+        Returns:
+            dict | None: The counters, or None if caching is disabled
+        """
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
+    async def _access_token(
+        self: "AsyncSpotifyClient", refresh: bool = False
+    ) -> str:
+        """Gets the client credentials access token, requesting a new one
+        when there is none, it is about to expire or it was rejected.
+        Concurrent callers wait for the same refresh
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            refresh (bool, optional): Whether the current token was
+            rejected. Defaults to False.
+
+        Raises:
+            ValueError: If the Spotify environment variables are missing
+            SpotifyException: If the token request fails
+
+        Returns:
+            str: The access token
+        """
+        stale = self._token
+        async with self._token_lock:
+            if refresh and self._token != stale:
+                # another request already replaced the rejected token
+                return self._token
+            if (
+                self._token is not None
+                and not refresh
+                and time.monotonic() < self._token_expires - TOKEN_MARGIN
+            ):
+                return self._token
+            if self._client_id is None or self._client_secret is None:
+                raise ValueError("Missing Spotify environment variables")
+            auth = aiohttp.BasicAuth(self._client_id, self._client_secret)
+            async with self._session.post(
+                TOKEN_URL,
+                data={"grant_type": "client_credentials"},
+                auth=auth,
+            ) as response:
+                if response.status != 200:
+                    raise SpotifyException(
+                        response.status,
+                        -1,
+                        f"{TOKEN_URL}: {await response.text()}",
+                    )
+                token = await response.json()
+            metrics.increment("spotify_token_refreshes_total")
+            self._token = token["access_token"]
+            self._token_expires = time.monotonic() + token["expires_in"]
+            return self._token
+
+    async def _request(
+        self: "AsyncSpotifyClient",
+        endpoint: str,
+        params: dict,
+        path: str,
+        query: dict,
+    ) -> Any:
+        """Serves a request from the response cache, or joins an identical
+        request in flight, or fetches it and caches the response. Requests
+        are keyed like SpotifyClient's, so both share a response cache
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            endpoint (str): The endpoint name
+            params (dict): The request parameters
+            path (str): The API path, relative to API_URL
+            query (dict): The query string parameters
+
+        Returns:
+            Any: The response
+        """
+        metrics.increment("spotify_requests_total", endpoint=endpoint)
+        if self._cache is not None:
+            # the cache may commit to disk, so it is kept off the event loop
+            response = await asyncio.get_running_loop().run_in_executor(
+                None, self._cache.get, endpoint, params
+            )
+            if response is not None:
+                metrics.increment(
+                    "spotify_cache_hits_total", endpoint=endpoint
+                )
+                return response
+            metrics.increment("spotify_cache_misses_total", endpoint=endpoint)
+
+        key = (endpoint, cache_key(params))
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics.increment("spotify_coalesced_total", endpoint=endpoint)
+            # shielded so a cancelled caller does not cancel the others
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(
+            self._fetch_and_cache(endpoint, params, path, query)
+        )
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(
+        self: "AsyncSpotifyClient",
+        endpoint: str,
+        params: dict,
+        path: str,
+        query: dict,
+    ) -> Any:
+        """Fetches a response and caches it, even if every caller waiting
+        for it was cancelled
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            endpoint (str): The endpoint name
+            params (dict): The request parameters
+            path (str): The API path, relative to API_URL
+            query (dict): The query string parameters
+
+        Returns:
+            Any: The response
+        """
+        response = await self._fetch(endpoint, path, query)
+        if self._cache is not None and response is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._cache.set, endpoint, params, response
+            )
+        return response
+
+    async def _fetch(
+        self: "AsyncSpotifyClient", endpoint: str, path: str, query: dict
+    ) -> Any:
+        """Performs an API request under the rate limiter, waiting out 429
+        responses for their Retry-After period, backing off on server
+        errors and refreshing a rejected token once
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            endpoint (str): The endpoint name, for the metrics
+            path (str): The API path, relative to API_URL
+            query (dict): The query string parameters
+
+        Raises:
+            SpotifyException: If the request fails after the retries
+
+        Returns:
+            Any: The response
+        """
+        if self._session is None:
+            await self.open()
+        refreshed = False
+        start = time.perf_counter()
+        try:
+            for attempt in range(self._max_retries + 1):
+                if self._limiter is not None:
+                    with metrics.timer("spotify_limiter_wait_seconds"):
+                        await self._limiter.acquire_async()
+                token = await self._access_token()
+                async with self._session.get(
+                    API_URL + path,
+                    params=query,
+                    headers={"Authorization": f"Bearer {token}"},
+                ) as response:
+                    if response.status == 200:
+                        body = await response.read()
+                        metrics.increment(
+                            "spotify_response_bytes_total",
+                            len(body),
+                            endpoint=endpoint,
+                        )
+                        if self._limiter is not None:
+                            self._limiter.reward()
+                        return json.loads(body)
+                    metrics.increment(
+                        "spotify_errors_total",
+                        endpoint=endpoint,
+                        status=response.status,
+                    )
+                    message = await response.text()
+                    # a case-insensitive copy, as header names may be
+                    # lowercase
+                    headers = response.headers.copy()
+                if attempt == self._max_retries:
+                    break
+                if response.status == 401 and not refreshed:
+                    refreshed = True
+                    await self._access_token(refresh=True)
+                elif response.status == 429:
+                    retry_after = float(
+                        headers.get("Retry-After", 2**attempt)
+                    )
+                    logger.warning(
+                        "Rate limited, retrying in %ss (attempt %s/%s)",
+                        retry_after,
+                        attempt + 1,
+                        self._max_retries,
+                    )
+                    if self._limiter is not None:
+                        self._limiter.penalize(retry_after)
+                    else:
+                        await asyncio.sleep(retry_after)
+                elif response.status in RETRY_STATUSES:
+                    await asyncio.sleep(0.3 * 2**attempt)
+                else:
+                    break
+                metrics.increment("spotify_retries_total", endpoint=endpoint)
+            raise SpotifyException(
+                response.status,
+                -1,
+                f"{API_URL + path}: {message}",
+                headers=headers,
+            )
+        finally:
+            metrics.observe(
+                "spotify_request_seconds",
+                time.perf_counter() - start,
+                endpoint=endpoint,
+            )
+
+    async def get_artist(self: "AsyncSpotifyClient", artist_id: str) -> Any:
+        """Gets artist information from Spotify API
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            artist_id (str): The artist id
+
+        Returns:
+            dict: Artist information
+        """
+        return await self._request(
+            "artist", {"artist_id": artist_id}, f"artists/{artist_id}", {}
+        )
+
+    async def search(
+        self: "AsyncSpotifyClient", q: str, cat: str, limit: int, offset: int
+    ) -> Any:
+        """Searches Spotify API for artists, albums, or tracks
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            q (str): The search query
+            cat (str): The category to search
+            limit (int): The number of results to return
+            offset (int): The offset for the search
+
+        Returns:
+            dict: The search results
+        """
+        params = {"q": q, "type": cat, "limit": limit, "offset": offset}
+        return await self._request("search", params, "search", params)
+
+    async def artists(self: "AsyncSpotifyClient", artists: list) -> Any:
+        """Gets artist information from Spotify API
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            artists (list): The artist ids
+
+        Returns:
+            dict: Artist information
+        """
+        return await self._request(
+            "artists",
+            {"artists": list(artists)},
+            "artists",
+            {"ids": ",".join(artists)},
+        )
+
+    async def artist_albums(
+        self: "AsyncSpotifyClient",
+        artist_id: str,
+        album_type: str,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Any:
+        """Gets albums for a given artist
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            artist_id (str): The artist id
+            album_type (str): The type of album
+            limit (int, optional): The number of albums to return. Defaults
+            to 20.
+            offset (int, optional): The offset for albums. Defaults to 0.
+
+        Returns:
+            dict: The albums
+        """
+        return await self._request(
+            "artist_albums",
+            {
+                "artist_id": artist_id,
+                "album_type": album_type,
+                "limit": limit,
+                "offset": offset,
+            },
+            f"artists/{artist_id}/albums",
+            {"include_groups": album_type, "limit": limit, "offset": offset},
+        )
+
+    async def album_tracks(
+        self: "AsyncSpotifyClient",
+        album_id: str,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> Any:
+        """Gets tracks for a given album
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            album_id (str): The album id
+            limit (int, optional): The number of tracks to return. Defaults
+            to 50.
+            offset (int, optional): The offset for tracks. Defaults to 0.
+
+        Returns:
+            dict: The tracks
+        """
+        return await self._request(
+            "album_tracks",
+            {"album_id": album_id, "limit": limit, "offset": offset},
+            f"albums/{album_id}/tracks",
+            {"limit": limit, "offset": offset},
+        )
+
+    async def albums(self: "AsyncSpotifyClient", albums: list) -> Any:
+        """Gets album information from Spotify API
+
+        Args:
+            self (AsyncSpotifyClient): Instance of AsyncSpotifyClient
+            albums (list): The album ids
+
+        Returns:
+            dict: Album information
+        """
+        return await self._request(
+            "albums",
+            {"albums": list(albums)},
+            "albums",
+            {"ids": ",".join(albums)},
+        )
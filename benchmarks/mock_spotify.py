@@ -0,0 +1,338 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from spotipy.exceptions import SpotifyException
+from spotify_client import rate_limited_session
+from benchmarks.synthetic import SyntheticCatalog
+import spotipy
+
+NEXT = "https://api.spotify.com/v1/next"
+
+
+class MockSpotify:
+    """Local stand-in for the spotipy.Spotify endpoints SpotifyClient uses,
+    serving a synthetic catalog with injectable latency and 429 responses.
+    Serve it with MockSpotifyServer so requests go through spotipy's HTTP
+    stack, or pass it to SpotifyClient as its backend directly."""
+
+    def __init__(
+        self: "MockSpotify",
+        catalog: SyntheticCatalog,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_probability: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.calls = {}
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._artists = {artist["id"]: artist for artist in catalog.artists}
+        self._albums = {}
+        self._artist_albums = {}
+        rng = random.Random(seed)
+        tracks = list(catalog.raw_tracks())
+        position = 0
+        while position < len(tracks):
+            size = rng.choice([1, 1, 2, 5, 12, 20, 80])
+            album_tracks = tracks[position : position + size]
+            position += size
+            album_id = f"album{len(self._albums):017d}"
+            year = rng.randint(2000, 2024)
+            self._albums[album_id] = {
+                "id": album_id,
+                "release_date": f"{year}-{rng.randint(1, 12):02d}-01",
+                "release_date_precision": "day",
+                "tracks": album_tracks,
+            }
+            for track in album_tracks:
+                for artist in track["artists"]:
+                    listed = self._artist_albums.setdefault(artist["id"], [])
+                    if not listed or listed[-1] != album_id:
+                        listed.append(album_id)
+
+    def _request(self: "MockSpotify", endpoint: str) -> None:
+        """Simulates the latency and rate limiting of a request
+
+        Args:
+            self (MockSpotify): Instance of MockSpotify
+            endpoint (str): The endpoint name
+
+        Raises:
+            SpotifyException: A 429 with a Retry-After header
+        """
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            limited = self._rng.random() < self.rate_limit_probability
+            delay = self.latency + self._rng.random() * self.jitter
+            if limited:
+                self.rate_limited += 1
+        if delay:
+            time.sleep(delay)
+        if limited:
+            raise SpotifyException(
+                429,
+                -1,
+                f"{endpoint}: API rate limit exceeded",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+    @staticmethod
+    def _page(items: list, limit: int, offset: int) -> dict:
+        """Builds a paging object
+
+        Args:
+            items (list): All items
+            limit (int): The page size
+            offset (int): The page offset
+
+        Returns:
+            dict: The paging object
+        """
+        return {
+            "items": items[offset : offset + limit],
+            "next": NEXT if offset + limit < len(items) else None,
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+        }
+
+    def _simplified_album(self: "MockSpotify", album_id: str) -> dict:
+        """Builds the simplified album object listed by artist_albums
+
+        Args:
+            self (MockSpotify): Instance of MockSpotify
+            album_id (str): The album id
+
+        Returns:
+            dict: The simplified album
+        """
+        album = self._albums[album_id]
+        return {
+            "id": album_id,
+            "release_date": album["release_date"],
+            "release_date_precision": album["release_date_precision"],
+        }
+
+    def artist(self: "MockSpotify", artist_id: str) -> dict:
+        """Mocks spotipy.Spotify.artist"""
+        self._request("artist")
+        return {**self._artists[artist_id], "popularity": 50}
+
+    def artists(self: "MockSpotify", artists: list) -> dict:
+        """Mocks spotipy.Spotify.artists"""
+        self._request("artists")
+        return {
+            "artists": [
+                {**self._artists[artist_id], "popularity": 50}
+                for artist_id in artists
+            ]
+        }
+
+    def search(
+        self: "MockSpotify",
+        q: str,
+        limit: int = 10,
+        offset: int = 0,
+        type: str = "track",
+    ) -> dict:
+        """Mocks spotipy.Spotify.search, returning a stable random sample
+        of up to 1000 artists for each genre query"""
+        self._request("search")
+        genre = q.split(":", 1)[-1]
+        rng = random.Random(genre)
+        artists = [
+            {**artist, "popularity": rng.randint(20, 100)}
+            for artist in rng.sample(
+                list(self._artists.values()), min(1000, len(self._artists))
+            )
+        ]
+        return {"artists": self._page(artists, limit, offset)}
+
+    def artist_albums(
+        self: "MockSpotify",
+        artist_id: str,
+        album_type: str | None = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        """Mocks spotipy.Spotify.artist_albums, newest first"""
+        self._request("artist_albums")
+        albums = sorted(
+            (
+                self._simplified_album(album_id)
+                for album_id in self._artist_albums.get(artist_id, [])
+            ),
+            key=lambda album: album["release_date"],
+            reverse=True,
+        )
+        return self._page(albums, limit, offset)
+
+    def albums(self: "MockSpotify", albums: list) -> dict:
+        """Mocks spotipy.Spotify.albums, embedding the first 50 tracks"""
+        self._request("albums")
+        if len(albums) > 20:
+            raise SpotifyException(400, -1, "albums: too many ids requested")
+        return {
+            "albums": [
+                {
+                    **self._simplified_album(album_id),
+                    "tracks": self._page(
+                        self._albums[album_id]["tracks"], 50, 0
+                    ),
+                }
+                if album_id in self._albums
+                else None
+                for album_id in albums
+            ]
+        }
+
+    def album_tracks(
+        self: "MockSpotify", album_id: str, limit: int = 50, offset: int = 0
+    ) -> dict:
+        """Mocks spotipy.Spotify.album_tracks"""
+        self._request("album_tracks")
+        return self._page(self._albums[album_id]["tracks"], limit, offset)
+
+
+class MockSpotifyServer:
+    """Serves a MockSpotify over HTTP on a local port, so a real
+    spotipy.Spotify goes through requests and urllib3 as it would against
+    the Web API, including how 429 responses and their Retry-After
+    headers are handled. Use as a context manager."""
+
+    def __init__(self: "MockSpotifyServer", mock: MockSpotify) -> None:
+        self.mock = mock
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._handler()
+        )
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self: "MockSpotifyServer") -> str:
+        """The API prefix the server answers under"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def __enter__(self: "MockSpotifyServer") -> "MockSpotifyServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self: "MockSpotifyServer", *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def client(self: "MockSpotifyServer") -> spotipy.Spotify:
+        """Builds a spotipy.Spotify pointed at the server, with the session
+        SpotifyClient uses under a rate limiter
+
+        Args:
+            self (MockSpotifyServer): Instance of MockSpotifyServer
+
+        Returns:
+            spotipy.Spotify: The client
+        """
+        spotify = spotipy.Spotify(
+            auth="mock", requests_session=rate_limited_session()
+        )
+        spotify.prefix = self.url
+        return spotify
+
+    def route(self: "MockSpotifyServer", path: str, query: dict) -> dict:
+        """Calls the MockSpotify endpoint for a request
+
+        Args:
+            self (MockSpotifyServer): Instance of MockSpotifyServer
+            path (str): The request path, without the /v1/ prefix
+            query (dict): The query parameters, one value each
+
+        Raises:
+            KeyError: If the path or an id is unknown
+
+        Returns:
+            dict: The response
+        """
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+        match path.strip("/").split("/"):
+            case ["search"]:
+                return self.mock.search(
+                    query["q"], int(query.get("limit", 10)), offset
+                )
+            case ["artists"]:
+                return self.mock.artists(query["ids"].split(","))
+            case ["artists", artist_id]:
+                return self.mock.artist(artist_id)
+            case ["artists", artist_id, "albums"]:
+                return self.mock.artist_albums(
+                    artist_id, query.get("album_type"), limit, offset
+                )
+            case ["albums"]:
+                return self.mock.albums(query["ids"].split(","))
+            case ["albums", album_id, "tracks"]:
+                return self.mock.album_tracks(
+                    album_id, int(query.get("limit", 50)), offset
+                )
+        raise KeyError(path)
+
+    def _handler(self: "MockSpotifyServer") -> type:
+        """Builds the request handler class bound to this server
+
+        Args:
+            self (MockSpotifyServer): Instance of MockSpotifyServer
+
+        Returns:
+            type: The BaseHTTPRequestHandler subclass
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so the session's connection pool is exercised
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, so small responses
+            # would otherwise wait on delayed acks
+            disable_nagle_algorithm = True
+
+            def do_GET(self: "Handler") -> None:
+                url = urlsplit(self.path)
+                query = {
+                    key: values[-1]
+                    for key, values in parse_qs(url.query).items()
+                }
+                headers = {}
+                try:
+                    status = 200
+                    body = server.route(url.path.removeprefix("/v1/"), query)
+                except SpotifyException as e:
+                    status = e.http_status
+                    headers = e.headers or {}
+                    body = {"error": {"status": status, "message": str(e)}}
+                except KeyError:
+                    status = 404
+                    body = {"error": {"status": 404, "message": "Not found"}}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self: "Handler", format: str, *args) -> None:
+                pass
+
+        return Handler
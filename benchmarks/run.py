@@ -0,0 +1,411 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from file_utilities import iter_track_batches, read_track_csv
+from graph_snapshot import export_snapshot, load_snapshot
+from metrics import metrics
+from neo4j_client import Neo4jClient, warm_up
+from path_engine import PathEngine
+from rate_limiter import RateLimiter
+from separation import separation_report
+from six_degrees import SixDegrees
+from spotify_client import SpotifyClient
+from track_filter import TrackFilter
+from benchmarks.mock_spotify import MockSpotify, MockSpotifyServer
+from benchmarks.synthetic import SyntheticCatalog
+
+logger = logging.getLogger()
+STAGES = [
+    "read_track_csv",
+    "iter_track_batches",
+    "filter_tracks",
+    "engine_build",
+    "shortest_path",
+    "snapshot",
+    "separation",
+    "scrape",
+    "neo4j",
+]
+
+
+def percentiles(samples: list) -> dict:
+    """Summarizes latency samples
+
+    Args:
+        samples (list): Latencies in seconds
+
+    Returns:
+        dict: The p50, p90, p99 and max latencies in milliseconds
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def stage_result(
+    items: int, seconds: float, latencies: list | None = None
+) -> dict:
+    """Builds a stage result
+
+    Args:
+        items (int): The number of items processed
+        seconds (float): The wall-clock time
+        latencies (list | None, optional): Per-item latencies in seconds.
+        Defaults to None.
+
+    Returns:
+        dict: The items, seconds, throughput and latency percentiles
+    """
+    return {
+        "items": items,
+        "seconds": seconds,
+        "throughput": items / seconds if seconds else 0.0,
+        "latency": percentiles(latencies or []),
+    }
+
+
+@contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """Temporarily changes the working directory, as the pipeline reads and
+    writes data/ relative to it
+
+    Args:
+        path (str): The directory
+
+    Yields:
+        Iterator[None]: Nothing
+    """
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+class TimedBackend:
+    """Wraps a Spotify backend and records the latency of each call"""
+
+    def __init__(self: "TimedBackend", backend: Any) -> None:
+        self._backend = backend
+        self.latencies = []
+
+    def __getattr__(self: "TimedBackend", name: str) -> Callable:
+        method = getattr(self._backend, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        return timed
+
+
+def random_pairs(engine: PathEngine, count: int, seed: int) -> list:
+    """Picks random artist id pairs
+
+    Args:
+        engine (PathEngine): The path engine
+        count (int): The number of pairs
+        seed (int): The random seed
+
+    Returns:
+        list: (start_id, end_id) tuples
+    """
+    rng = random.Random(seed)
+    ids = engine.artist_ids
+    return [
+        (ids[rng.randrange(len(ids))], ids[rng.randrange(len(ids))])
+        for _ in range(count)
+    ]
+
+
+def bench_queries(engine: PathEngine, pairs: list) -> dict:
+    """Times shortest path queries one by one
+
+    Args:
+        engine (PathEngine): The path engine
+        pairs (list): (start_id, end_id) tuples
+
+    Returns:
+        dict: The stage result
+    """
+    latencies = []
+    start = time.perf_counter()
+    for start_id, end_id in pairs:
+        query_start = time.perf_counter()
+        engine.shortest_path(start_id, end_id)
+        latencies.append(time.perf_counter() - query_start)
+    return stage_result(len(pairs), time.perf_counter() - start, latencies)
+
+
+def run(args: argparse.Namespace, workdir: str) -> dict:
+    """Runs the selected benchmark stages on a synthetic catalog
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        workdir (str): The directory for the generated files
+
+    Returns:
+        dict: The result of each stage
+    """
+    stages = args.stages.split(",") if args.stages else STAGES[:-1]
+    results = {}
+    artist_path = os.path.join(workdir, "artists.csv")
+    track_path = os.path.join(workdir, "tracks.csv")
+    snapshot_path = os.path.join(workdir, "graph.snap")
+
+    logger.info("Generating %s synthetic artists", args.artists)
+    catalog = SyntheticCatalog(args.artists, args.tracks_per_artist, args.seed)
+    catalog.write_csvs(artist_path, track_path)
+
+    if "read_track_csv" in stages:
+        start = time.perf_counter()
+        tracks = read_track_csv(track_path)
+        results["read_track_csv"] = stage_result(
+            len(tracks), time.perf_counter() - start
+        )
+
+    if "iter_track_batches" in stages:
+        start = time.perf_counter()
+        count = sum(
+            len(batch)
+            for batch in iter_track_batches(track_path, args.workers)
+        )
+        results["iter_track_batches"] = stage_result(
+            count, time.perf_counter() - start
+        )
+
+    if "filter_tracks" in stages:
+        raw_tracks = list(catalog.raw_tracks())
+        start = time.perf_counter()
+        track_filter = TrackFilter(artist["id"] for artist in catalog.artists)
+        for track in raw_tracks:
+            track_filter.accept(track)
+        results["filter_tracks"] = stage_result(
+            len(raw_tracks), time.perf_counter() - start
+        )
+
+    start = time.perf_counter()
+    engine = PathEngine.from_csv(artist_path, track_path)
+    if "engine_build" in stages:
+        results["engine_build"] = stage_result(
+            len(engine.track_ids), time.perf_counter() - start
+        )
+    pairs = random_pairs(engine, args.queries, args.seed)
+
+    if "shortest_path" in stages:
+        results["shortest_path"] = bench_queries(engine, pairs)
+
+    if "snapshot" in stages:
+        start = time.perf_counter()
+        export_snapshot(engine, snapshot_path)
+        results["snapshot_export"] = stage_result(
+            len(engine.track_ids), time.perf_counter() - start
+        )
+        start = time.perf_counter()
+        snapshot = load_snapshot(snapshot_path)
+        results["snapshot_load"] = stage_result(
+            1, time.perf_counter() - start
+        )
+        results["snapshot_shortest_path"] = bench_queries(snapshot, pairs)
+
+    if "separation" in stages:
+        start = time.perf_counter()
+        report = separation_report(
+            engine, sample=args.sample, workers=args.workers
+        )
+        results["separation"] = stage_result(
+            report["sources"], time.perf_counter() - start
+        )
+
+    if "scrape" in stages:
+        results["scrape"] = bench_scrape(args, workdir)
+
+    if "neo4j" in stages:
+        results.update(bench_neo4j(catalog, artist_path, track_path, pairs))
+    return results
+
+
+def bench_scrape(args: argparse.Namespace, workdir: str) -> dict:
+    """Times the track scrape pipeline against the mock Spotify backend
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        workdir (str): The directory for the generated files
+
+    Returns:
+        dict: The stage result, with per-request latencies and the run's
+        metrics
+    """
+    catalog = SyntheticCatalog(
+        args.scrape_artists, args.tracks_per_artist, args.seed + 1
+    )
+    mock = MockSpotify(
+        catalog,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+    )
+    scrape_dir = os.path.join(workdir, "scrape")
+    os.makedirs(os.path.join(scrape_dir, "data"))
+    catalog.write_csvs(
+        os.path.join(scrape_dir, "data", "artists.csv"),
+        os.path.join(scrape_dir, "data", "tracks.csv"),
+    )
+    with open(
+        os.path.join(scrape_dir, "data", "genres.json"), "w", encoding="utf-8"
+    ) as file:
+        json.dump(["pop"], file)
+    metrics.reset()
+    # served over HTTP so 429s go through urllib3 as they would in a run
+    with MockSpotifyServer(mock) as server, working_directory(scrape_dir):
+        backend = TimedBackend(server.client())
+        spotify = SpotifyClient(
+            limiter=RateLimiter(rate=args.rate), backend=backend
+        )
+        six_degrees = SixDegrees(spotify=spotify)
+        start = time.perf_counter()
+        six_degrees.initialize_tracks(args.workers)
+        seconds = time.perf_counter() - start
+    result = stage_result(sum(mock.calls.values()), seconds, backend.latencies)
+    result["calls"] = mock.calls
+    result["rate_limited"] = mock.rate_limited
+    result["metrics"] = metrics.snapshot()
+    return result
+
+
+def bench_neo4j(
+    catalog: SyntheticCatalog, artist_path: str, track_path: str, pairs: list
+) -> dict:
+    """Times the Neo4j import and queries. This clears the target database,
+    so only point NEO4J_URI at a scratch instance
+
+    Args:
+        catalog (SyntheticCatalog): The synthetic catalog
+        artist_path (str): The path to the artist file
+        track_path (str): The path to the track file
+        pairs (list): (start_id, end_id) tuples to query
+
+    Returns:
+        dict: The result of each Neo4j stage
+    """
+    tracks = read_track_csv(track_path)
+    results = {}
+    warm_up()
+    with Neo4jClient() as neo4j_client:
+        neo4j_client.clear_graph()
+        start = time.perf_counter()
+        neo4j_client.create_artist_nodes(catalog.artists)
+        results["neo4j_artists"] = stage_result(
+            len(catalog.artists), time.perf_counter() - start
+        )
+        start = time.perf_counter()
+        neo4j_client.create_track_nodes(tracks)
+        results["neo4j_tracks"] = stage_result(
+            len(tracks), time.perf_counter() - start
+        )
+        start = time.perf_counter()
+        neo4j_client.create_relationships()
+        results["neo4j_relationships"] = stage_result(
+            sum(len(track["artists"]) for track in tracks),
+            time.perf_counter() - start,
+        )
+        start = time.perf_counter()
+        neo4j_client.shortest_paths(pairs)
+        results["neo4j_shortest_paths"] = stage_result(
+            len(pairs), time.perf_counter() - start
+        )
+        neo4j_client.clear_graph()
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Finds the stages whose throughput dropped below the baseline
+
+    Args:
+        results (dict): The current results
+        baseline (dict): The baseline results
+        tolerance (float): The allowed relative drop
+
+    Returns:
+        list: Messages describing each regression
+    """
+    messages = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        expected = baseline[stage]["throughput"]
+        if result["throughput"] < expected * (1 - tolerance):
+            messages.append(
+                f"{stage}: {result['throughput']:.1f}/s "
+                f"vs baseline {expected:.1f}/s"
+            )
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the pipeline on synthetic catalogs"
+    )
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--tracks-per-artist", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--stages",
+        default=None,
+        help=f"Comma separated stages out of {','.join(STAGES)}. "
+        "Defaults to every stage but neo4j",
+    )
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--scrape-artists", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    parser.add_argument("--baseline", help="Compare against a results file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="six-degrees-bench-") as workdir:
+        results = run(args, workdir)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for message in found:
+            print(f"Regression: {message}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
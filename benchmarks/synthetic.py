@@ -0,0 +1,135 @@
+import random
+import string
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Iterator
+from file_utilities import write_csv, write_csv_header
+from track_filter import TrackFilter
+
+ID_ALPHABET = string.ascii_letters + string.digits
+SYLLABLES = ["ka", "lo", "mi", "ra", "ze", "tu", "vi", "no", "sa", "el", "dj"]
+
+
+def spotify_id(rng: random.Random) -> str:
+    """Generates a random 22 character base62 id, like Spotify's
+
+    Args:
+        rng (random.Random): The random generator
+
+    Returns:
+        str: The id
+    """
+    return "".join(rng.choices(ID_ALPHABET, k=22))
+
+
+def artist_name(rng: random.Random) -> str:
+    """Generates a random artist name
+
+    Args:
+        rng (random.Random): The random generator
+
+    Returns:
+        str: The name
+    """
+    words = [
+        "".join(rng.choices(SYLLABLES, k=rng.randint(1, 3))).capitalize()
+        for _ in range(rng.randint(1, 2))
+    ]
+    return " ".join(words)
+
+
+class SyntheticCatalog:
+    """Random artist/track catalog shaped like the scraped data. Artist
+    popularity follows a power law, so a few hub artists collaborate with
+    many others like in the real collaboration graph"""
+
+    def __init__(
+        self: "SyntheticCatalog",
+        artists: int = 1000,
+        tracks_per_artist: float = 4.0,
+        seed: int = 0,
+        skew: float = 0.8,
+    ) -> None:
+        self._rng = random.Random(seed)
+        self.artists = [
+            {"name": artist_name(self._rng), "id": spotify_id(self._rng)}
+            for _ in range(artists)
+        ]
+        self._cum_weights = list(
+            accumulate(1 / (rank + 1) ** skew for rank in range(artists))
+        )
+        self.track_count = int(artists * tracks_per_artist)
+
+    def _pick_artists(self: "SyntheticCatalog", count: int) -> list:
+        """Picks distinct artists weighted by popularity
+
+        Args:
+            self (SyntheticCatalog): Instance of SyntheticCatalog
+            count (int): The number of artists
+
+        Returns:
+            list: The artists
+        """
+        total = self._cum_weights[-1]
+        picked = {}
+        while len(picked) < min(count, len(self.artists)):
+            i = bisect_left(self._cum_weights, self._rng.random() * total)
+            picked[min(i, len(self.artists) - 1)] = None
+        return [self.artists[i] for i in picked]
+
+    def raw_tracks(self: "SyntheticCatalog") -> Iterator[dict]:
+        """Yields tracks shaped like Spotify API track objects, including
+        some solo tracks, duplicates and artists outside the catalog
+
+        Args:
+            self (SyntheticCatalog): Instance of SyntheticCatalog
+
+        Yields:
+            Iterator[dict]: The tracks
+        """
+        previous = None
+        for _ in range(self.track_count):
+            if previous is not None and self._rng.random() < 0.05:
+                yield previous
+                continue
+            count = self._rng.choices([1, 2, 3, 4], weights=[3, 6, 2, 1])[0]
+            artists = [
+                {"name": artist["name"], "id": artist["id"]}
+                for artist in self._pick_artists(count)
+            ]
+            if self._rng.random() < 0.1:
+                artists.append(
+                    {"name": "Unknown", "id": spotify_id(self._rng)}
+                )
+            previous = {
+                "name": f"Track {self._rng.getrandbits(32):08x}",
+                "id": spotify_id(self._rng),
+                "artists": artists,
+            }
+            yield previous
+
+    def write_csvs(
+        self: "SyntheticCatalog", artist_path: str, track_path: str
+    ) -> int:
+        """Writes the catalog as artists.csv/tracks.csv files, keeping one
+        collaboration per artist pair like the scraper does
+
+        Args:
+            self (SyntheticCatalog): Instance of SyntheticCatalog
+            artist_path (str): The path to the artist file
+            track_path (str): The path to the track file
+
+        Returns:
+            int: The number of tracks written
+        """
+        write_csv_header(artist_path, ["name", "id"])
+        write_csv(artist_path, self.artists, ["name", "id"])
+        track_filter = TrackFilter(artist["id"] for artist in self.artists)
+        tracks = [
+            track
+            for track in map(track_filter.accept, self.raw_tracks())
+            if track is not None
+        ]
+        write_csv_header(track_path, ["name", "id", "artists"])
+        write_csv(track_path, tracks, ["name", "id", "artists"])
+        return len(tracks)
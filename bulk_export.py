@@ -0,0 +1,129 @@
+import os
+import csv
+import logging
+from file_utilities import read_artist_csv, iter_track_csv
+
+logger = logging.getLogger()
+ARRAY_DELIMITER = ";"
+ARTIST_NODE_HEADERS = ["id:ID(Artist)", "name", ":LABEL"]
+TRACK_NODE_HEADERS = [
+    "id:ID(Track)",
+    "name",
+    "artists:string[]",
+    ":LABEL",
+]
+APPEARS_ON_HEADERS = [":START_ID(Artist)", ":END_ID(Track)", ":TYPE"]
+
+
+def export_bulk_csvs(
+    artist_path: str = "data/artists.csv",
+    track_path: str = "data/tracks.csv",
+    output_dir: str = "data/import",
+) -> dict:
+    """Converts the artist and track files into node and relationship files
+    for the offline neo4j-admin importer. The result is the same graph the
+    batched Cypher import builds: Artist and Track nodes keyed by their
+    Spotify ids in separate id spaces, with an APPEARS_ON relationship from
+    each known artist to each of their tracks. Tracks are streamed, so the
+    track file is never held in memory
+
+    Args:
+        artist_path (str, optional): The path to the artist file. Defaults
+        to "data/artists.csv".
+        track_path (str, optional): The path to the track file. Defaults to
+        "data/tracks.csv".
+        output_dir (str, optional): The directory for the importer files.
+        Defaults to "data/import".
+
+    Returns:
+        dict: The paths of the artist, track and relationship files and the
+        number of artists, tracks and relationships written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        "artists": os.path.join(output_dir, "artists.csv"),
+        "tracks": os.path.join(output_dir, "tracks.csv"),
+        "appears_on": os.path.join(output_dir, "appears_on.csv"),
+    }
+    artist_ids = set()
+    with open(paths["artists"], "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(ARTIST_NODE_HEADERS)
+        for artist in read_artist_csv(artist_path):
+            # duplicate ids fail the import, where MERGE would skip them
+            if artist["id"] not in artist_ids:
+                artist_ids.add(artist["id"])
+                writer.writerow([artist["id"], artist["name"], "Artist"])
+
+    track_ids = set()
+    relationships = 0
+    with open(
+        paths["tracks"], "w", encoding="utf-8", newline=""
+    ) as track_file, open(
+        paths["appears_on"], "w", encoding="utf-8", newline=""
+    ) as relationship_file:
+        track_writer = csv.writer(track_file)
+        relationship_writer = csv.writer(relationship_file)
+        track_writer.writerow(TRACK_NODE_HEADERS)
+        relationship_writer.writerow(APPEARS_ON_HEADERS)
+        for track in iter_track_csv(track_path):
+            if track["id"] in track_ids:
+                continue
+            track_ids.add(track["id"])
+            track_writer.writerow(
+                [
+                    track["id"],
+                    track["name"],
+                    ARRAY_DELIMITER.join(track["artists"]),
+                    "Track",
+                ]
+            )
+            for artist_id in dict.fromkeys(track["artists"]):
+                if artist_id in artist_ids:
+                    relationship_writer.writerow(
+                        [artist_id, track["id"], "APPEARS_ON"]
+                    )
+                    relationships += 1
+    logger.info(
+        "Exported %s artists, %s tracks and %s relationships to %s",
+        len(artist_ids),
+        len(track_ids),
+        relationships,
+        output_dir,
+    )
+    return {
+        **paths,
+        "artist_count": len(artist_ids),
+        "track_count": len(track_ids),
+        "relationship_count": relationships,
+    }
+
+
+def import_command(
+    export: dict, database: str = "neo4j", admin: str = "neo4j-admin"
+) -> list[str]:
+    """Builds the neo4j-admin command importing exported files into a new
+    database. The database must be stopped while it runs, and everything
+    in it is replaced
+
+    Args:
+        export (dict): The paths returned by export_bulk_csvs
+        database (str, optional): The database name. Defaults to "neo4j".
+        admin (str, optional): The neo4j-admin executable. Defaults to
+        "neo4j-admin".
+
+    Returns:
+        list[str]: The command arguments
+    """
+    return [
+        admin,
+        "database",
+        "import",
+        "full",
+        f"--nodes={os.path.abspath(export['artists'])}",
+        f"--nodes={os.path.abspath(export['tracks'])}",
+        f"--relationships={os.path.abspath(export['appears_on'])}",
+        f"--array-delimiter={ARRAY_DELIMITER}",
+        "--overwrite-destination=true",
+        database,
+    ]
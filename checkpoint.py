@@ -0,0 +1,189 @@
+import json
+import os
+
+# kept per journaled album, so a resumed run can still raise the sync
+# high-water marks from the release dates
+ALBUM_KEYS = ("id", "release_date", "release_date_precision")
+
+
+class Checkpoint:
+    """Append-only journal of completed initialization work, so an
+    interrupted run can resume where it stopped.
+
+    Each line is a JSON event: a scraped genre with its artists, a scraped
+    artist discography with its album ids and release dates, a batch of
+    albums whose tracks were written, a completed stage, or a reset of the
+    track stage. Album batches are only journaled by commit, after their
+    tracks have been written out.
+    """
+
+    def __init__(
+        self: "Checkpoint", path: str = "data/checkpoint.jsonl"
+    ) -> None:
+        self._path = path
+        self._pending = []
+        self.stages = set()
+        self.genres = {}
+        self.discographies = {}
+        self.albums = set()
+        # whether this journal's run started the track stage, so its
+        # tracks file is its own to resume
+        self.tracks_started = False
+        self.load()
+
+    def load(self: "Checkpoint") -> None:
+        """Replays the journal, cutting off a line left incomplete by an
+        interruption
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+        """
+        self.stages.clear()
+        self.genres.clear()
+        self.discographies.clear()
+        self.albums.clear()
+        self.tracks_started = False
+        if not os.path.isfile(self._path):
+            return
+        valid = 0
+        with open(self._path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(event)
+                valid += len(line)
+        if valid != os.path.getsize(self._path):
+            with open(self._path, "r+b") as file:
+                file.truncate(valid)
+
+    def clear(self: "Checkpoint") -> None:
+        """Starts a new, empty journal
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+        """
+        with open(self._path, "w", encoding="utf-8") as _:
+            pass
+        self._pending = []
+        self.load()
+
+    def record_stage(self: "Checkpoint", stage: str) -> None:
+        """Records a completed stage
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            stage (str): The stage name
+        """
+        self._record({"event": "stage", "stage": stage})
+
+    def reset_tracks(self: "Checkpoint") -> None:
+        """Forgets the journaled discographies and album batches, for a
+        fresh track scrape that keeps the journaled artists
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+        """
+        self._pending = []
+        self._record({"event": "reset", "scope": "tracks"})
+
+    def record_genre(self: "Checkpoint", genre: str, artists: list) -> None:
+        """Records the artists scraped for a genre
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            genre (str): The genre
+            artists (list): The scraped artists
+        """
+        artists = [
+            {
+                "name": artist["name"],
+                "id": artist["id"],
+                "popularity": artist["popularity"],
+            }
+            for artist in artists
+        ]
+        self._record({"event": "genre", "genre": genre, "artists": artists})
+
+    def record_discography(
+        self: "Checkpoint", artist_id: str, albums: list
+    ) -> None:
+        """Records the albums scraped for an artist
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            artist_id (str): The artist id
+            albums (list): The scraped albums
+        """
+        self._record(
+            {
+                "event": "discography",
+                "id": artist_id,
+                "albums": [
+                    {key: album[key] for key in ALBUM_KEYS if key in album}
+                    for album in albums
+                ],
+            }
+        )
+
+    def mark_albums(self: "Checkpoint", album_ids: list) -> None:
+        """Marks albums whose tracks have all been filtered, to be journaled
+        by the next commit
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            album_ids (list): The album ids
+        """
+        self._pending += album_ids
+
+    def commit(self: "Checkpoint") -> None:
+        """Journals the marked albums, once their tracks are written
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+        """
+        if self._pending:
+            self._record({"event": "albums", "ids": self._pending})
+            self._pending = []
+
+    def _record(self: "Checkpoint", event: dict) -> None:
+        """Appends an event to the journal and syncs it to disk
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            event (dict): The event
+        """
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(event, separators=(",", ":")) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self._apply(event)
+
+    def _apply(self: "Checkpoint", event: dict) -> None:
+        """Applies an event to the in-memory state
+
+        Args:
+            self (Checkpoint): Instance of Checkpoint
+            event (dict): The event
+        """
+        kind = event["event"]
+        if kind == "stage":
+            self.stages.add(event["stage"])
+        elif kind == "genre":
+            self.genres[event["genre"]] = event["artists"]
+        elif kind == "discography":
+            # journals from before release dates were kept list bare ids
+            self.discographies[event["id"]] = [
+                album if isinstance(album, dict) else {"id": album}
+                for album in event["albums"]
+            ]
+        elif kind == "albums":
+            self.albums.update(event["ids"])
+        elif kind == "reset":
+            self.tracks_started = True
+            self.stages.discard("tracks")
+            self.discographies.clear()
+            self.albums.clear()
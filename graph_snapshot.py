@@ -0,0 +1,212 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Sequence
+from path_engine import PathEngine
+
+MAGIC = b"SDGRAPH1"
+# magic, byte order, artist count, track count, edge count
+HEADER = struct.Struct("<8s8sQQQ")
+ALIGNMENT = 8
+
+
+class StringTable(Sequence[str]):
+    """Read-only sequence of strings stored as an offset array into a UTF-8
+    blob, decoded on access"""
+
+    def __init__(self: "StringTable", offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self: "StringTable") -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self: "StringTable", i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self.raw(i), "utf-8")
+
+    def __iter__(self: "StringTable") -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def raw(self: "StringTable", i: int) -> bytes:
+        """Gets the encoded bytes of a string
+
+        Args:
+            self (StringTable): Instance of StringTable
+            i (int): The string's position
+
+        Returns:
+            bytes: The UTF-8 bytes
+        """
+        return bytes(self._blob[self._offsets[i] : self._offsets[i + 1]])
+
+
+class SortedIndex:
+    """Maps strings of a StringTable to their positions by binary search
+    over a stored sort order, so no dictionary has to be built on load"""
+
+    def __init__(self: "SortedIndex", table: StringTable, order: memoryview):
+        self._table = table
+        self._order = order
+
+    def __len__(self: "SortedIndex") -> int:
+        return len(self._order)
+
+    def __contains__(self: "SortedIndex", key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self: "SortedIndex", key: str) -> int:
+        i = self.get(key)
+        if i is None:
+            raise KeyError(key)
+        return i
+
+    def get(self: "SortedIndex", key: str, default: int | None = None):
+        """Gets the position of a string
+
+        Args:
+            self (SortedIndex): Instance of SortedIndex
+            key (str): The string
+            default (int | None, optional): Returned when the string is not
+            in the table. Defaults to None.
+
+        Returns:
+            int | None: The position, or default
+        """
+        target = key.encode("utf-8")
+        pos = bisect_left(
+            range(len(self._order)),
+            target,
+            key=lambda j: self._table.raw(self._order[j]),
+        )
+        if pos < len(self._order):
+            i = self._order[pos]
+            if self._table.raw(i) == target:
+                return i
+        return default
+
+
+def _string_sections(strings: Sequence[str]) -> tuple[array, bytes]:
+    """Encodes strings as an offset array and a UTF-8 blob
+
+    Args:
+        strings (Sequence[str]): The strings
+
+    Returns:
+        tuple[array, bytes]: The offsets and the blob
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = array("q", [0]) * (len(encoded) + 1)
+    for i, data in enumerate(encoded):
+        offsets[i + 1] = offsets[i] + len(data)
+    return offsets, b"".join(encoded)
+
+
+def export_snapshot(engine: PathEngine, path: str) -> None:
+    """Writes a path engine to a binary snapshot file
+
+    The file is a header followed by 8-byte aligned sections, each prefixed
+    by its byte length: the CSR offsets, neighbors and edge tracks, the
+    artist id table with its sort order, and the artist name, track id and
+    track name tables.
+
+    Args:
+        engine (PathEngine): The engine to export
+        path (str): The path to the snapshot file
+    """
+    artist_count = len(engine.artist_ids)
+    order = array(
+        "i",
+        sorted(
+            range(artist_count),
+            key=lambda i: engine.artist_ids[i].encode("utf-8"),
+        ),
+    )
+    sections = [
+        array("q", engine.offsets).tobytes(),
+        array("i", engine.neighbors).tobytes(),
+        array("i", engine.edge_tracks).tobytes(),
+        order.tobytes(),
+    ]
+    for strings in (
+        engine.artist_ids,
+        engine.artist_names,
+        engine.track_ids,
+        engine.track_names,
+    ):
+        offsets, blob = _string_sections(strings)
+        sections += [offsets.tobytes(), blob]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(
+            HEADER.pack(
+                MAGIC,
+                sys.byteorder.encode("ascii").ljust(8, b"\0"),
+                artist_count,
+                len(engine.track_ids),
+                len(engine.neighbors),
+            )
+        )
+        for section in sections:
+            file.write(struct.pack("<Q", len(section)))
+            file.write(section)
+            file.write(b"\0" * (-len(section) % ALIGNMENT))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> PathEngine:
+    """Memory-maps a binary snapshot as a path engine. Nothing is parsed
+    up front: the engine reads the arrays and strings straight from the
+    mapped pages, which the OS shares between processes loading the same
+    file
+
+    Args:
+        path (str): The path to the snapshot file
+
+    Raises:
+        ValueError: If the file is not a snapshot for this platform
+
+    Returns:
+        PathEngine: The engine
+    """
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    magic, byteorder, _, _, _ = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a graph snapshot")
+    if byteorder.rstrip(b"\0").decode("ascii") != sys.byteorder:
+        raise ValueError(f"{path} was written on a different byte order")
+
+    sections = []
+    position = HEADER.size
+    while position < len(view):
+        (length,) = struct.unpack_from("<Q", view, position)
+        position += 8
+        sections.append(view[position : position + length])
+        position += length + (-length % ALIGNMENT)
+
+    offsets = sections[0].cast("q")
+    neighbors = sections[1].cast("i")
+    edge_tracks = sections[2].cast("i")
+    order = sections[3].cast("i")
+    artist_ids, artist_names, track_ids, track_names = (
+        StringTable(sections[i].cast("q"), sections[i + 1])
+        for i in range(4, 12, 2)
+    )
+    return PathEngine(
+        artist_ids,
+        artist_names,
+        track_ids,
+        track_names,
+        offsets,
+        neighbors,
+        edge_tracks,
+        SortedIndex(artist_ids, order),
+    )
@@ -0,0 +1,448 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Callable
+from graph_snapshot import ALIGNMENT
+from path_engine import PathEngine
+
+MAGIC = b"SDLABEL1"
+# magic, byte order, artist count, hub count, track count
+HEADER = struct.Struct("<8s8sQQQ")
+# distances are stored as bytes, far above any degree of separation
+UNREACHABLE = 0xFF
+
+
+def _set_label(hubs: array, distances: array, rank: int, depth: int) -> None:
+    """Adds a hub to an artist's label, or shortens its distance
+
+    Args:
+        hubs (array): The label's hub ranks, in ascending order
+        distances (array): The distance to each hub
+        rank (int): The rank of the hub
+        depth (int): The distance to the hub
+    """
+    i = bisect_left(hubs, rank)
+    if i < len(hubs) and hubs[i] == rank:
+        distances[i] = depth
+    else:
+        hubs.insert(i, rank)
+        distances.insert(i, depth)
+
+
+def _pruned_bfs(
+    engine: PathEngine,
+    labels: tuple[list, list],
+    rank: int,
+    root: int,
+    start: int,
+    depth: int,
+    root_distances: list,
+    edge_steps: array | None = None,
+    step: int = 0,
+) -> None:
+    """Labels the artists reached from a hub, skipping every artist whose
+    labels already prove a path to the hub at least as short, along with
+    everything behind it
+
+    Args:
+        engine (PathEngine): The path engine
+        labels (tuple[list, list]): The hub ranks and distances of each
+        artist's label, updated in place
+        rank (int): The rank of the hub
+        root (int): Index of the hub artist
+        start (int): Index of the artist the search starts from, the hub
+        itself or the far end of a new edge
+        depth (int): The distance from the hub to start
+        root_distances (list): Scratch space of UNREACHABLE per rank
+        edge_steps (array | None, optional): The insertion step of each
+        edge, -1 for the edges the labels already cover. Defaults to None,
+        for every edge.
+        step (int, optional): Only follow edges inserted up to this step.
+        Defaults to 0.
+    """
+    hubs, distances = labels
+    offsets = engine.offsets
+    neighbors = engine.neighbors
+    for hub, distance in zip(hubs[root], distances[root]):
+        root_distances[hub] = distance
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for artist in frontier:
+            known = UNREACHABLE
+            for hub, distance in zip(hubs[artist], distances[artist]):
+                if root_distances[hub] + distance < known:
+                    known = root_distances[hub] + distance
+            if known <= depth:
+                continue
+            _set_label(hubs[artist], distances[artist], rank, depth)
+            for edge in range(offsets[artist], offsets[artist + 1]):
+                if edge_steps is not None and edge_steps[edge] > step:
+                    continue
+                other = neighbors[edge]
+                if other not in seen:
+                    seen.add(other)
+                    next_frontier.append(other)
+        frontier = next_frontier
+        depth += 1
+    for hub in hubs[root]:
+        root_distances[hub] = UNREACHABLE
+
+
+class HubLabels:
+    """Distance oracle over the collaboration graph, built by pruned
+    landmark labeling
+
+    Every artist gets a label of (hub, distance) pairs such that any two
+    connected artists share a hub on one of their shortest paths, so the
+    degrees of separation are the smallest sum of distances over the hubs
+    they share. Hubs are processed from the most collaborations down, and
+    each BFS stops wherever earlier hubs already cover the distance, which
+    keeps labels to a few dozen entries on a hub-dominated graph. When only
+    the top hubs are labeled, the labels give an upper bound that a BFS
+    limited to shorter paths confirms.
+
+    Labels are stored in CSR form like the engine: the hub ranks of artist
+    i are hubs[offsets[i]:offsets[i + 1]] in ascending order, with their
+    distances at the same positions, and order maps ranks back to artist
+    indexes. The index belongs to the artist file it was built from.
+    """
+
+    def __init__(
+        self: "HubLabels",
+        order: array | memoryview,
+        offsets: array | memoryview,
+        hubs: array | memoryview,
+        distances: array | memoryview,
+        track_count: int,
+        last_track_id: str,
+    ) -> None:
+        self.order = order
+        self.offsets = offsets
+        self.hubs = hubs
+        self.distances = distances
+        self.track_count = track_count
+        self.last_track_id = last_track_id
+
+    @property
+    def complete(self: "HubLabels") -> bool:
+        """Whether every artist is a hub, so the labels are exact"""
+        return len(self.order) == len(self.offsets) - 1
+
+    @classmethod
+    def build(
+        cls: type["HubLabels"],
+        engine: PathEngine,
+        max_hubs: int | None = None,
+    ) -> "HubLabels":
+        """Labels the graph from its best connected artists down
+
+        Args:
+            cls (type[HubLabels]): The HubLabels class
+            engine (PathEngine): The path engine
+            max_hubs (int | None, optional): Only label from this many
+            hubs, trading exact answers for a faster build. Defaults to
+            None, for every artist.
+
+        Returns:
+            HubLabels: The index
+        """
+        artist_count = len(engine.artist_ids)
+        offsets = engine.offsets
+        order = sorted(
+            range(artist_count),
+            key=lambda i: offsets[i + 1] - offsets[i],
+            reverse=True,
+        )[:max_hubs]
+        labels = (
+            [array("i") for _ in range(artist_count)],
+            [array("B") for _ in range(artist_count)],
+        )
+        root_distances = [UNREACHABLE] * len(order)
+        for rank, root in enumerate(order):
+            _pruned_bfs(engine, labels, rank, root, root, 0, root_distances)
+        index = cls(
+            array("i", order), array("q"), array("i"), array("B"), 0, ""
+        )
+        index._pack(labels, engine)
+        return index
+
+    def _unpack(self: "HubLabels") -> tuple[list, list]:
+        """Copies the labels into one growable array pair per artist
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+
+        Returns:
+            tuple[list, list]: The hub ranks and distances of each label
+        """
+        hubs, distances = [], []
+        for i in range(len(self.offsets) - 1):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            hubs.append(array("i", self.hubs[start:end]))
+            distances.append(array("B", self.distances[start:end]))
+        return hubs, distances
+
+    def _pack(
+        self: "HubLabels", labels: tuple[list, list], engine: PathEngine
+    ) -> None:
+        """Stores per-artist labels in CSR form, stamped with the tracks of
+        the engine they were computed on
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            labels (tuple[list, list]): The hub ranks and distances of each
+            label
+            engine (PathEngine): The path engine
+        """
+        hubs, distances = labels
+        self.offsets = array("q", [0]) * (len(hubs) + 1)
+        for i, label in enumerate(hubs):
+            self.offsets[i + 1] = self.offsets[i] + len(label)
+        self.hubs = array("i")
+        self.distances = array("B")
+        for label_hubs, label_distances in zip(hubs, distances):
+            self.hubs += label_hubs
+            self.distances += label_distances
+        self.track_count = len(engine.track_ids)
+        self.last_track_id = (
+            engine.track_ids[self.track_count - 1] if self.track_count else ""
+        )
+
+    def update(self: "HubLabels", engine: PathEngine) -> bool:
+        """Brings the labels up to date with an engine built after new
+        tracks were appended to the track file. The new collaborations are
+        inserted one at a time in track order, each resuming the pruned BFS
+        of the hubs labeling either end, so only the artists it brings
+        closer to a hub are visited. Distances that got
+        shorter are superseded rather than removed, which keeps answers
+        exact. Nothing can be reused when the artists changed or tracks
+        were removed
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            engine (PathEngine): The path engine with the new tracks
+
+        Returns:
+            bool: Whether the labels were updated, False if they have to be
+            rebuilt
+        """
+        track_count = self.track_count
+        if len(engine.artist_ids) != len(self.offsets) - 1:
+            return False
+        if len(engine.track_ids) < track_count:
+            return False
+        if track_count and (
+            engine.track_ids[track_count - 1] != self.last_track_id
+        ):
+            return False
+
+        offsets = engine.offsets
+        neighbors = engine.neighbors
+        edge_tracks = engine.edge_tracks
+        # the pruning is only sound while the labels cover the graph, so
+        # the new collaborations go in one at a time, each resumed search
+        # following only the edges inserted so far
+        inserted = {}
+        for artist in range(len(engine.artist_ids)):
+            for edge in range(offsets[artist], offsets[artist + 1]):
+                if edge_tracks[edge] >= track_count:
+                    other = neighbors[edge]
+                    key = (
+                        edge_tracks[edge],
+                        min(artist, other),
+                        max(artist, other),
+                    )
+                    inserted.setdefault(key, []).append(edge)
+        collaborations = sorted(inserted)
+        edge_steps = array("i", [-1]) * len(neighbors)
+        for step, key in enumerate(collaborations):
+            for edge in inserted[key]:
+                edge_steps[edge] = step
+
+        labels = self._unpack()
+        hubs, distances = labels
+        root_distances = [UNREACHABLE] * len(self.order)
+        for step, (_, artist, other) in enumerate(collaborations):
+            ends = {}
+            for start, end in ((artist, other), (other, artist)):
+                for rank, distance in zip(hubs[start], distances[start]):
+                    ends.setdefault(rank, []).append((end, distance + 1))
+            for rank in sorted(ends):
+                for end, depth in ends[rank]:
+                    _pruned_bfs(
+                        engine,
+                        labels,
+                        rank,
+                        self.order[rank],
+                        end,
+                        depth,
+                        root_distances,
+                        edge_steps,
+                        step,
+                    )
+        self._pack(labels, engine)
+        return True
+
+    def distance(self: "HubLabels", start: int, end: int) -> int | None:
+        """Gets the shortest distance between two artist indexes through a
+        shared hub
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            start (int): Index of the starting artist
+            end (int): Index of the ending artist
+
+        Returns:
+            int | None: The distance, exact if the labels are complete and
+            an upper bound otherwise, or None if they share no hub
+        """
+        offsets = self.offsets
+        start_hubs = dict(
+            zip(
+                self.hubs[offsets[start] : offsets[start + 1]],
+                self.distances[offsets[start] : offsets[start + 1]],
+            )
+        )
+        best = None
+        for i in range(offsets[end], offsets[end + 1]):
+            distance = start_hubs.get(self.hubs[i])
+            if distance is not None:
+                distance += self.distances[i]
+                if best is None or distance < best:
+                    best = distance
+        return best
+
+    def degrees(
+        self: "HubLabels", engine: PathEngine, start_id: str, end_id: str
+    ) -> int | None:
+        """Gets the degrees of separation between two artists, falling
+        back to a BFS for shorter paths when the labels are incomplete
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            engine (PathEngine): The path engine the labels were built on
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+
+        Returns:
+            int | None: The degrees of separation, or None if there is no
+            path or an artist is not in the graph
+        """
+        start = engine.artist_index(start_id)
+        end = engine.artist_index(end_id)
+        if start is None or end is None:
+            return None
+        bound = self.distance(start, end)
+        if self.complete:
+            return bound
+        if bound is None:
+            hops = engine.shortest_hops(start, end)
+        else:
+            hops = engine.shortest_hops(start, end, max_hops=bound - 1)
+            if hops is None:
+                return bound
+        return None if hops is None else len(hops)
+
+    def heuristic(
+        self: "HubLabels", engine: PathEngine, end_id: str
+    ) -> Callable[[int], float]:
+        """Builds an A* heuristic for PathEngine.weighted_path with the
+        "hops" weight from complete labels, which give the exact remaining
+        distance
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            engine (PathEngine): The path engine the labels were built on
+            end_id (str): id of the ending artist
+
+        Returns:
+            Callable[[int], float]: The hops from an artist index to the
+            end, or 0.0 where the labels do not bound it from below
+        """
+        end = engine.artist_index(end_id)
+
+        def remaining(artist: int) -> float:
+            if end is None or not self.complete:
+                return 0.0
+            distance = self.distance(artist, end)
+            return 0.0 if distance is None else float(distance)
+
+        return remaining
+
+    def save(self: "HubLabels", path: str) -> None:
+        """Writes the labels to a file, in the same sectioned layout as the
+        graph snapshot: the header, then the hub order, the label offsets,
+        hubs and distances and the last track id, each prefixed by its byte
+        length
+
+        Args:
+            self (HubLabels): Instance of HubLabels
+            path (str): The path to the index file
+        """
+        sections = [
+            array("i", self.order).tobytes(),
+            array("q", self.offsets).tobytes(),
+            array("i", self.hubs).tobytes(),
+            array("B", self.distances).tobytes(),
+            self.last_track_id.encode("utf-8"),
+        ]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC,
+                    sys.byteorder.encode("ascii").ljust(8, b"\0"),
+                    len(self.offsets) - 1,
+                    len(self.order),
+                    self.track_count,
+                )
+            )
+            for section in sections:
+                file.write(struct.pack("<Q", len(section)))
+                file.write(section)
+                file.write(b"\0" * (-len(section) % ALIGNMENT))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls: type["HubLabels"], path: str) -> "HubLabels":
+        """Memory-maps an index file
+
+        Args:
+            cls (type[HubLabels]): The HubLabels class
+            path (str): The path to the index file
+
+        Raises:
+            ValueError: If the file is not a label index for this platform
+
+        Returns:
+            HubLabels: The index
+        """
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        magic, byteorder, _, _, track_count = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a hub label index")
+        if byteorder.rstrip(b"\0").decode("ascii") != sys.byteorder:
+            raise ValueError(f"{path} was written on a different byte order")
+
+        sections = []
+        position = HEADER.size
+        while position < len(view):
+            (length,) = struct.unpack_from("<Q", view, position)
+            position += 8
+            sections.append(view[position : position + length])
+            position += length + (-length % ALIGNMENT)
+        return cls(
+            sections[0].cast("i"),
+            sections[1].cast("q"),
+            sections[2].cast("i"),
+            sections[3],
+            track_count,
+            str(sections[4], "utf-8"),
+        )
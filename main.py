@@ -1,26 +1,105 @@
 from six_degrees import SixDegrees
+import json
+import shlex
+import shutil
+import subprocess
+from bulk_export import import_command
+from neo4j_client import warm_up
 from logging_config import configure_logger
+from metrics import metrics, profiled
+from path_cache import PathCache
+from analytics import BETWEENNESS_SAMPLE
+from rate_limiter import RateLimiter
+from response_cache import SQLiteCache
+from server import serve
 import argparse
 
 
 def main(args: argparse.Namespace) -> None:
     configure_logger()
-    six_degrees = SixDegrees()
+    cache = None if args.no_cache else SQLiteCache(args.cache_path)
+    limiter = RateLimiter(rate=args.rate)
+    six_degrees = SixDegrees(
+        cache=cache,
+        limiter=limiter,
+        path_cache=PathCache.from_env(),
+        genres_path=args.genres,
+    )
+    try:
+        with profiled(args.profile):
+            run_mode(args, six_degrees)
+    finally:
+        metrics.log_summary()
+        if args.metrics:
+            metrics.export(args.metrics)
+
+
+def run_mode(args: argparse.Namespace, six_degrees: SixDegrees) -> None:
+    if args.init or args.imprt or args.clear or args.refresh:
+        warm_up()
     # six_degrees.verify_conn()
-    if args.init:
+    if args.init and args.resume:
+        six_degrees.initialize_data(
+            args.workers, resume=True, pages=args.genre_pages
+        )
+    elif args.init:
         sure = input(
             "Are you sure you want to initialize the database? Warning: this will override the csv files and database (y/n): "
         )
         if sure.lower() == "y":
-            six_degrees.initialize_data()
+            six_degrees.initialize_data(args.workers, pages=args.genre_pages)
         else:
             print("Database not initialized.")
+    elif args.refresh:
+        six_degrees.refresh_tracks(args.workers)
+    elif args.separation:
+        report = six_degrees.separation_report(args.sample, args.workers)
+        if not args.eccentricities:
+            del report["eccentricities"]
+        print(json.dumps(report, indent=2))
+    elif args.report:
+        sample = BETWEENNESS_SAMPLE if args.sample is None else args.sample
+        report = six_degrees.analytics_report(sample, args.top, args.workers)
+        print(json.dumps(report, indent=2))
+    elif args.serve:
+        serve(
+            six_degrees,
+            args.host,
+            args.port,
+            use_engine=args.backend == "engine",
+            max_concurrency=args.max_concurrency,
+            timeout=args.timeout,
+        )
+    elif args.labels:
+        six_degrees.build_labels(args.max_hubs)
+    elif args.degrees:
+        print(six_degrees.degrees_of_separation(*args.degrees))
+    elif args.paths:
+        paths = six_degrees.find_ranked_paths(*args.paths, k=args.k)
+        print(json.dumps(paths, indent=2))
+    elif args.snapshot:
+        six_degrees.export_snapshot()
+    elif args.bulk_export:
+        export = six_degrees.export_bulk_import(args.bulk_export)
+        command = import_command(export, args.database)
+        print(shlex.join(command))
+        if shutil.which(command[0]) is None:
+            return
+        sure = input(
+            f"Run the import now? Warning: the {args.database} database must be stopped and will be overwritten (y/n): "
+        )
+        if sure.lower() == "y":
+            subprocess.run(command, check=True)
+            six_degrees.graph_changed()
+            print("Database imported. Start it and run with -d to create the id constraints.")
+        else:
+            print("Database not imported.")
     elif args.imprt:
         sure = input(
             "Are you sure you want to import the database via csv files? Warning: this will override the current database (y/n): "
         )
         if sure.lower() == "y":
-            six_degrees.import_tracks()
+            six_degrees.import_tracks(args.workers)
         else:
             print("Database not imported.")
     elif args.debug:
@@ -34,7 +113,7 @@ def main(args: argparse.Namespace) -> None:
     else:
         # six_degrees.initialize_artists()
         # six_degrees.import_tracks()
-        six_degrees.initialize_tracks()
+        six_degrees.initialize_tracks(args.workers, resume=args.resume)
         # six_degrees.create_relationships()
         # start = input("Starting artist name: ")
         # end = input("Ending artist name: ")
@@ -49,6 +128,133 @@ if __name__ == "__main__":
         action="store_true",
         help="Flag to specify initialization from Spotify API",
     )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Flag to resume an interrupted initialization",
+    )
+    parser.add_argument(
+        "-u",
+        "--refresh",
+        action="store_true",
+        help="Flag to add collaborations released since the last sync",
+    )
+    parser.add_argument(
+        "-s",
+        "--snapshot",
+        action="store_true",
+        help="Flag to export the csv files as a binary graph snapshot",
+    )
+    parser.add_argument(
+        "--bulk-export",
+        nargs="?",
+        const="data/import",
+        default=None,
+        help="Flag to export the csv files for neo4j-admin database import, "
+        "to the given directory (default data/import)",
+    )
+    parser.add_argument(
+        "--database",
+        default="neo4j",
+        help="Database name used by the --bulk-export import command",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Flag to run the HTTP path, degree and artist lookup service",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interface the --serve service listens on",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port the --serve service listens on",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["neo4j", "engine"],
+        default="neo4j",
+        help="Whether --serve finds paths with Neo4j or the in-process "
+        "path engine",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=1024,
+        help="Requests --serve handles at once before rejecting more",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=10.0,
+        help="Seconds before a --serve request times out",
+    )
+    parser.add_argument(
+        "--labels",
+        action="store_true",
+        help="Flag to build the hub label index for --degrees",
+    )
+    parser.add_argument(
+        "--max-hubs",
+        type=int,
+        default=None,
+        help="Number of best connected artists labeled by --labels "
+        "(default all, for exact answers without a BFS)",
+    )
+    parser.add_argument(
+        "--degrees",
+        nargs=2,
+        metavar=("START", "END"),
+        default=None,
+        help="Names of two artists to print the degrees of separation of",
+    )
+    parser.add_argument(
+        "--paths",
+        nargs=2,
+        metavar=("START", "END"),
+        default=None,
+        help="Names of two artists to print the cheapest paths between",
+    )
+    parser.add_argument(
+        "-k",
+        type=int,
+        default=1,
+        help="Number of paths printed by --paths",
+    )
+    parser.add_argument(
+        "--separation",
+        action="store_true",
+        help="Flag to report the degrees of separation across artist pairs",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=None,
+        help="Number of source artists sampled by --separation, or by "
+        f"--report for betweenness (default {BETWEENNESS_SAMPLE})",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Flag to report the components, degree distribution, "
+        "betweenness and articulation points of the collaboration graph",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of artists listed per ranking by --report",
+    )
+    parser.add_argument(
+        "--eccentricities",
+        action="store_true",
+        help="Flag to include each artist's eccentricity in --separation",
+    )
     parser.add_argument(
         "-m",
         "--imprt",
@@ -67,5 +273,55 @@ if __name__ == "__main__":
         action="store_true",
         help="Flag to specify clearing of the database",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Flag to disable the on-disk Spotify response cache",
+    )
+    parser.add_argument(
+        "--cache-path",
+        default="data/spotify_cache.sqlite",
+        help="Path to the on-disk Spotify response cache",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of genres and artist discographies scraped "
+        "concurrently, or of processes parsing the track file for --imprt",
+    )
+    parser.add_argument(
+        "--genres",
+        default="data/genres.json",
+        help="Path to the genres scraped by --init, e.g. "
+        "data/all_genres.json",
+    )
+    parser.add_argument(
+        "--genre-pages",
+        type=int,
+        default=1,
+        help="Pages of 50 artists scraped per genre by --init, at most 20",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Maximum Spotify API requests per second",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="Path to export the run metrics to, as Prometheus text if it "
+        "ends in .prom and as JSON otherwise",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="data/profile.pstats",
+        default=None,
+        help="Flag to run under cProfile, writing the stats to the given "
+        "path (default data/profile.pstats)",
+    )
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,356 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+logger = logging.getLogger()
+# latency samples kept per timer for the percentiles
+RESERVOIR_SIZE = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    """Builds the registry key of a labelled metric
+
+    Args:
+        name (str): The metric name
+        labels (dict): The metric labels
+
+    Returns:
+        tuple: The name and the sorted label pairs
+    """
+    return (name, tuple(sorted(labels.items())))
+
+
+def _label_text(labels: tuple, extra: tuple = ()) -> str:
+    """Formats labels in the Prometheus text format
+
+    Args:
+        labels (tuple): Sorted (name, value) label pairs
+        extra (tuple, optional): Label pairs appended after them. Defaults
+        to ().
+
+    Returns:
+        str: The formatted labels, or an empty string if there are none
+    """
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(label, str(value).replace('"', '\\"'))
+        for label, value in pairs
+    )
+    return "{" + body + "}"
+
+
+class Timer:
+    """Running count, sum and maximum of a duration, with a reservoir
+    sample of the observations for percentiles"""
+
+    def __init__(self: "Timer") -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = []
+
+    def observe(self: "Timer", seconds: float) -> None:
+        """Records a duration
+
+        Args:
+            self (Timer): Instance of Timer
+            seconds (float): The duration
+        """
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self._samples) < RESERVOIR_SIZE:
+            self._samples.append(seconds)
+        else:
+            i = random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self._samples[i] = seconds
+
+    def quantile(self: "Timer", q: float) -> float:
+        """Estimates a quantile from the sampled durations
+
+        Args:
+            self (Timer): Instance of Timer
+            q (float): The quantile, between 0 and 1
+
+        Returns:
+            float: The duration, or 0.0 if nothing was recorded
+        """
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and timers for a run.
+    Counters add up events and sizes, such as requests, retries, cache hits
+    or bytes, while timers record durations, such as request latencies,
+    database transactions or whole pipeline stages"""
+
+    def __init__(self: "Metrics") -> None:
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._started = time.monotonic()
+
+    def reset(self: "Metrics") -> None:
+        """Clears every metric
+
+        Args:
+            self (Metrics): Instance of Metrics
+        """
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+            self._started = time.monotonic()
+
+    def increment(
+        self: "Metrics", name: str, value: float = 1, **labels: str
+    ) -> None:
+        """Adds to a counter
+
+        Args:
+            self (Metrics): Instance of Metrics
+            name (str): The counter name
+            value (float, optional): The amount to add. Defaults to 1.
+            labels (str): The counter labels, e.g. endpoint="albums"
+        """
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(
+        self: "Metrics", name: str, seconds: float, **labels: str
+    ) -> None:
+        """Records a duration in a timer
+
+        Args:
+            self (Metrics): Instance of Metrics
+            name (str): The timer name
+            seconds (float): The duration
+            labels (str): The timer labels, e.g. stage="scrape_tracks"
+        """
+        key = _key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = Timer()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self: "Metrics", name: str, **labels: str) -> Iterator[None]:
+        """Times the enclosed block, whether or not it raises
+
+        Args:
+            self (Metrics): Instance of Metrics
+            name (str): The timer name
+            labels (str): The timer labels
+
+        Yields:
+            Iterator[None]: Nothing
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self: "Metrics", name: str, **labels: str) -> Callable:
+        """Decorates a function so each call is timed. Generators return
+        immediately, so time the code consuming them instead
+
+        Args:
+            self (Metrics): Instance of Metrics
+            name (str): The timer name
+            labels (str): The timer labels
+
+        Returns:
+            Callable: The decorator
+        """
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def counter(self: "Metrics", name: str, **labels: str) -> float:
+        """Gets the value of a counter
+
+        Args:
+            self (Metrics): Instance of Metrics
+            name (str): The counter name
+            labels (str): The counter labels
+
+        Returns:
+            float: The value, 0 if it was never incremented
+        """
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self: "Metrics") -> dict:
+        """Gets every metric as plain data
+
+        Args:
+            self (Metrics): Instance of Metrics
+
+        Returns:
+            dict: The run's wall-clock seconds, the counters and the
+            timers, each a list of records with the name, labels and values
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            timers = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": timer.count,
+                    "total": timer.total,
+                    "mean": timer.total / timer.count,
+                    "max": timer.max,
+                    **{
+                        f"p{int(q * 100)}": timer.quantile(q)
+                        for q in QUANTILES
+                    },
+                }
+                for (name, labels), timer in sorted(self._timers.items())
+            ]
+            elapsed = time.monotonic() - self._started
+        return {"elapsed": elapsed, "counters": counters, "timers": timers}
+
+    def to_json(self: "Metrics") -> str:
+        """Exports the metrics as JSON
+
+        Args:
+            self (Metrics): Instance of Metrics
+
+        Returns:
+            str: The snapshot, as JSON
+        """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self: "Metrics") -> str:
+        """Exports the metrics in the Prometheus text exposition format.
+        Counters are exported as counters and timers as summaries
+
+        Args:
+            self (Metrics): Instance of Metrics
+
+        Returns:
+            str: The exposition text
+        """
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_label_text(labels)} {value}")
+            for (name, labels), timer in sorted(self._timers.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} summary")
+                for q in QUANTILES:
+                    quantile = _label_text(labels, (("quantile", q),))
+                    lines.append(f"{name}{quantile} {timer.quantile(q)}")
+                label_text = _label_text(labels)
+                lines.append(f"{name}_sum{label_text} {timer.total}")
+                lines.append(f"{name}_count{label_text} {timer.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self: "Metrics", path: str) -> None:
+        """Writes the metrics to a file, in the Prometheus text format if
+        the path ends in .prom and as JSON otherwise
+
+        Args:
+            self (Metrics): Instance of Metrics
+            path (str): The path to the file
+        """
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = self.to_json()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def log_summary(self: "Metrics") -> None:
+        """Logs a summary of the run: each counter, and the count, total
+        and tail latency of each timer
+
+        Args:
+            self (Metrics): Instance of Metrics
+        """
+        snapshot = self.snapshot()
+        logger.info("Run summary (%.1fs)", snapshot["elapsed"])
+        for counter in snapshot["counters"]:
+            logger.info(
+                "  %s%s: %s",
+                counter["name"],
+                _label_text(tuple(counter["labels"].items())),
+                counter["value"],
+            )
+        for timer in snapshot["timers"]:
+            logger.info(
+                "  %s%s: %s in %.3fs (mean %.1fms, p99 %.1fms, max %.1fms)",
+                timer["name"],
+                _label_text(tuple(timer["labels"].items())),
+                timer["count"],
+                timer["total"],
+                timer["mean"] * 1000,
+                timer["p99"] * 1000,
+                timer["max"] * 1000,
+            )
+
+
+# registry shared by the whole process
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(path: str | None, limit: int = 30) -> Iterator[None]:
+    """Runs the enclosed block under cProfile, writing the stats to a file
+    for pstats or snakeviz and logging the most expensive functions. Does
+    nothing if path is None
+
+    Args:
+        path (str | None): The path to the stats file
+        limit (int, optional): The number of functions logged. Defaults to
+        30.
+
+    Yields:
+        Iterator[None]: Nothing
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(limit)
+        logger.info("Profile written to %s\n%s", path, output.getvalue())
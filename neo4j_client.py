@@ -1,9 +1,71 @@
 import os
+import atexit
+import logging
+import threading
+from itertools import islice
+from typing import Iterable
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
+from neo4j import Driver, GraphDatabase
+from metrics import metrics
 
 load_dotenv()
 
+logger = logging.getLogger()
+BATCH_SIZE = 5000
+MAX_POOL_SIZE = 50
+
+_driver = None
+_driver_lock = threading.Lock()
+_constraints_created = False
+
+
+def get_driver() -> Driver:
+    """Gets the process-wide Neo4j driver, creating it on first use. The
+    driver keeps a pool of open connections that every Neo4jClient borrows
+    sessions from. The pool size is read from NEO4J_MAX_POOL_SIZE
+
+    Raises:
+        ValueError: If the Neo4j environment variables are missing
+
+    Returns:
+        Driver: The shared driver
+    """
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            uri = os.getenv("NEO4J_URI")
+            username = os.getenv("NEO4J_USERNAME")
+            password = os.getenv("NEO4J_PASSWORD")
+            if uri is None or username is None or password is None:
+                raise ValueError("Missing Neo4j environment variables")
+            pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", MAX_POOL_SIZE))
+            _driver = GraphDatabase.driver(
+                uri,
+                auth=(username, password),
+                max_connection_pool_size=pool_size,
+                keep_alive=True,
+            )
+        return _driver
+
+
+def warm_up() -> None:
+    """Creates the shared driver and verifies connectivity, so the first
+    request does not pay for the connection handshake"""
+    get_driver().verify_connectivity()
+
+
+def close_driver() -> None:
+    """Closes the shared driver and its connection pool"""
+    global _driver, _constraints_created
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+            _constraints_created = False
+
+
+atexit.register(close_driver)
+
 
 def clear_db() -> None:
     """Clears the Neo4j database"""
@@ -23,6 +85,17 @@ def clear_db_tracks() -> None:
         neo4j_client.clear_tracks()
 
 
+def _run_batch(tx, query: str, rows: list) -> None:
+    """Runs a batched query inside a write transaction
+
+    Args:
+        tx (ManagedTransaction): The write transaction
+        query (str): The query, reading its rows from $rows
+        rows (list): The rows to write
+    """
+    tx.run(query, rows=rows).consume()
+
+
 class Neo4jClient:
     """Neo4j class to handle neo4j database requests"""
 
@@ -30,17 +103,12 @@ class Neo4jClient:
         self._driver = None
 
     def __enter__(self):
-        uri = os.getenv("NEO4J_URI")
-        username = os.getenv("NEO4J_USERNAME")
-        password = os.getenv("NEO4J_PASSWORD")
-        if uri is None or username is None or password is None:
-            raise ValueError("Missing Neo4j environment variables")
-        self._driver = GraphDatabase.driver(uri, auth=(username, password))
+        self._driver = get_driver()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._driver is not None:
-            self._driver.close()
+        # the shared driver stays open for the next client
+        self._driver = None
 
     def clear_graph(self: "Neo4jClient") -> None:
         """Clears the Neo4j database
@@ -84,28 +152,58 @@ class Neo4jClient:
         if self._driver is not None:
             self._driver.verify_connectivity()
 
-    def create_artist_node(self: "Neo4jClient", artist: dict) -> None:
-        """Creates an artist node in the Neo4j database
+    def create_constraints(self: "Neo4jClient") -> None:
+        """Creates the uniqueness constraints for artist and track ids, once
+        per driver
 
         Args:
             self (Neo4jClient): Instance of Neo4jClient
-            artist (dict): The artist information
         """
-        if self._driver is not None:
+        global _constraints_created
+        if self._driver is not None and not _constraints_created:
             with self._driver.session() as session:
-                constraint = (
+                session.run(
                     "CREATE CONSTRAINT unique_artist_id IF NOT EXISTS "
                     "FOR (n: Artist) REQUIRE n.id IS UNIQUE"
                 )
-                session.run(constraint)
-
-                node_query = "MERGE (n:Artist {name: $name, id: $id})"
-
                 session.run(
-                    node_query,
-                    name=artist["name"],
-                    id=artist["id"],
+                    "CREATE CONSTRAINT unique_track_id IF NOT EXISTS "
+                    "FOR (n: Track) REQUIRE n.id IS UNIQUE"
                 )
+            _constraints_created = True
+
+    def create_artist_node(self: "Neo4jClient", artist: dict) -> None:
+        """Creates an artist node in the Neo4j database
+
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            artist (dict): The artist information
+        """
+        self.create_artist_nodes([artist])
+
+    def create_artist_nodes(
+        self: "Neo4jClient", artists: list, batch_size: int = BATCH_SIZE
+    ) -> None:
+        """Creates artist nodes in the Neo4j database in batches
+
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            artists (list): The artist information
+            batch_size (int, optional): The number of artists per
+            transaction. Defaults to BATCH_SIZE.
+        """
+        if self._driver is not None:
+            self.create_constraints()
+            node_query = (
+                "UNWIND $rows AS row "
+                "MERGE (n:Artist {id: row.id}) "
+                "SET n.name = row.name"
+            )
+            rows = [
+                {"name": artist["name"], "id": artist["id"]}
+                for artist in artists
+            ]
+            self._write_batches(node_query, rows, batch_size, "artists")
 
     def create_track_node(self: "Neo4jClient", track: dict) -> None:
         """Creates a track node in the Neo4j database
@@ -114,39 +212,175 @@ class Neo4jClient:
             self (Neo4jClient): Instance of Neo4jClient
             track (dict): The track information
         """
+        self.create_track_nodes([track])
+
+    def create_track_nodes(
+        self: "Neo4jClient",
+        tracks: list,
+        batch_size: int = BATCH_SIZE,
+        link: bool = False,
+    ) -> None:
+        """Creates track nodes in the Neo4j database in batches
+
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            tracks (list): The track information
+            batch_size (int, optional): The number of tracks per
+            transaction. Defaults to BATCH_SIZE.
+            link (bool, optional): Whether to also create the APPEARS_ON
+            relationships to the track's existing artist nodes. Defaults to
+            False.
+        """
         if self._driver is not None:
-            with self._driver.session() as session:
-                unique_track_constraint = (
-                    "CREATE CONSTRAINT unique_track_id IF NOT EXISTS "
-                    "FOR (n: Track) REQUIRE n.id IS UNIQUE"
+            self.create_constraints()
+            node_query = (
+                "UNWIND $rows AS row "
+                "MERGE (n:Track {id: row.id}) "
+                "SET n.name = row.name, n.artists = row.artists"
+            )
+            if link:
+                node_query += (
+                    " WITH n, row "
+                    "UNWIND row.artists AS artist_id "
+                    "MATCH (a:Artist {id: artist_id}) "
+                    "MERGE (a)-[:APPEARS_ON]->(n)"
                 )
-                session.run(unique_track_constraint)
+            rows = [
+                {
+                    "name": track["name"],
+                    "id": track["id"],
+                    "artists": track["artists"],
+                }
+                for track in tracks
+            ]
+            self._write_batches(node_query, rows, batch_size, "tracks")
+
+    def create_track_records(
+        self: "Neo4jClient",
+        batches: Iterable[list],
+        batch_size: int = BATCH_SIZE,
+        link: bool = False,
+    ) -> None:
+        """Creates track nodes from batches of parsed track records as they
+        arrive, e.g. from file_utilities.iter_track_batches. Records are
+        sent as positional lists rather than maps, so no keys are repeated
+        in every row
 
-                node_query = (
-                    "MERGE (n:Track {name: $name, id: $id, artists: $artists})"
-                )
-                session.run(
-                    node_query,
-                    name=track["name"],
-                    id=track["id"],
-                    artists=track["artists"],
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            batches (Iterable[list]): Lists of (name, id, artists) records
+            batch_size (int, optional): The number of tracks per
+            transaction. Defaults to BATCH_SIZE.
+            link (bool, optional): Whether to also create the APPEARS_ON
+            relationships to the track's existing artist nodes. Defaults to
+            False.
+        """
+        if self._driver is not None:
+            self.create_constraints()
+            node_query = (
+                "UNWIND $rows AS row "
+                "MERGE (n:Track {id: row[1]}) "
+                "SET n.name = row[0], n.artists = row[2]"
+            )
+            if link:
+                node_query += (
+                    " WITH n, row "
+                    "UNWIND row[2] AS artist_id "
+                    "MATCH (a:Artist {id: artist_id}) "
+                    "MERGE (a)-[:APPEARS_ON]->(n)"
                 )
-
-    def create_relationships(self: "Neo4jClient") -> None:
-        """Creates relationships between artists and tracks in the Neo4j
-        database
+            rows = (
+                [name, track_id, list(artists)]
+                for batch in batches
+                for name, track_id, artists in batch
+            )
+            self._write_batches(node_query, rows, batch_size, "tracks")
+
+    def _write_batches(
+        self: "Neo4jClient",
+        query: str,
+        rows: Iterable,
+        batch_size: int,
+        operation: str = "write",
+    ) -> None:
+        """Runs an UNWIND query over rows, one write transaction per batch,
+        timing each transaction. Rows may be streamed, and are only pulled
+        one batch at a time
 
         Args:
             self (Neo4jClient): Instance of Neo4jClient
+            query (str): The query, reading its rows from $rows
+            rows (Iterable): The rows to write
+            batch_size (int): The number of rows per transaction
+            operation (str, optional): The metrics label of the write.
+            Defaults to "write".
         """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive")
         if self._driver is not None:
+            rows = iter(rows)
             with self._driver.session() as session:
-                relationship_query = (
-                    "MATCH (a: Artist), (t: Track) "
-                    "WHERE a.id IN t.artists "
-                    "MERGE (a)-[:APPEARS_ON]->(t)"
-                )
-                session.run(relationship_query)
+                while batch := list(islice(rows, batch_size)):
+                    with metrics.timer(
+                        "neo4j_transaction_seconds", operation=operation
+                    ):
+                        session.execute_write(_run_batch, query, batch)
+                    metrics.increment(
+                        "neo4j_rows_written_total",
+                        len(batch),
+                        operation=operation,
+                    )
+
+    def create_relationships(
+        self: "Neo4jClient",
+        tracks: list | None = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> None:
+        """Creates relationships between artists and tracks in the Neo4j
+        database. Each track's artist ids are looked up through the unique
+        artist id index rather than scanning every artist/track pair
+
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            tracks (list | None, optional): Only link these tracks, e.g. the
+            ones just added. Defaults to None, which links every track.
+            batch_size (int, optional): The number of tracks per
+            transaction. Defaults to BATCH_SIZE.
+        """
+        if self._driver is None:
+            return
+        if tracks is not None:
+            relationship_query = (
+                "UNWIND $rows AS row "
+                "MATCH (t:Track {id: row.id}) "
+                "UNWIND row.artists AS artist_id "
+                "MATCH (a:Artist {id: artist_id}) "
+                "MERGE (a)-[:APPEARS_ON]->(t)"
+            )
+            rows = [
+                {"id": track["id"], "artists": track["artists"]}
+                for track in tracks
+            ]
+            self._write_batches(
+                relationship_query, rows, batch_size, "relationships"
+            )
+            return
+        with self._driver.session() as session:
+            relationship_query = (
+                "MATCH (t:Track) "
+                "CALL { "
+                "WITH t "
+                "UNWIND t.artists AS artist_id "
+                "MATCH (a:Artist {id: artist_id}) "
+                "MERGE (a)-[:APPEARS_ON]->(t) "
+                "} IN TRANSACTIONS OF $batch_size ROWS"
+            )
+            with metrics.timer(
+                "neo4j_query_seconds", query="create_relationships"
+            ):
+                session.run(
+                    relationship_query, batch_size=batch_size
+                ).consume()
 
     def shortest_path(self: "Neo4jClient", start_id: str, end_id: str) -> list:
         """Finds the shortest path between two artists, if it exists
@@ -167,17 +401,76 @@ class Neo4jClient:
                     "UNWIND nodes(p) AS node "
                     "RETURN node.id, node.name"
                 )
-                result = session.run(
-                    path_query, start_id=start_id, end_id=end_id
-                )
-                path = []
-
-                if result.peek() is None:
-                    print("No path found")
+                with metrics.timer(
+                    "neo4j_query_seconds", query="shortest_path"
+                ):
+                    result = session.run(
+                        path_query, start_id=start_id, end_id=end_id
+                    )
+                    path = []
+
+                    if result.peek() is None:
+                        logger.info("No path found")
+                        return path
+                    logger.info("Path found")
+                    for record in result:
+                        node_id = record["node.id"]
+                        path.append(node_id)
                     return path
-                print("Path found")
-                for record in result:
-                    node_id = record["node.id"]
-                    path.append(node_id)
-                return path
         return []
+
+    def shortest_paths(
+        self: "Neo4jClient", pairs: list, batch_size: int = 1000
+    ) -> list[dict]:
+        """Finds the shortest paths between many pairs of artists, running
+        one query per batch of pairs
+
+        Args:
+            self (Neo4jClient): Instance of Neo4jClient
+            pairs (list): (start_id, end_id) tuples
+            batch_size (int, optional): The number of pairs per query.
+            Defaults to 1000.
+
+        Returns:
+            list[dict]: For each pair in order, its start and end ids, the
+            ids of the alternating artist and track nodes on the path (empty
+            if there is none) and its degrees of separation (None if there
+            is no path)
+        """
+        paths = {}
+        if self._driver is not None:
+            path_query = (
+                "UNWIND $pairs AS pair "
+                "MATCH (start:Artist {id: pair.start}), "
+                "(end:Artist {id: pair.end}) "
+                "WHERE start <> end "
+                "OPTIONAL MATCH "
+                "p = shortestPath((start)-[:APPEARS_ON*]-(end)) "
+                "RETURN pair.start AS start, pair.end AS end, "
+                "[node IN nodes(p) | node.id] AS path"
+            )
+            with self._driver.session() as session:
+                for i in range(0, len(pairs), batch_size):
+                    batch = [
+                        {"start": start, "end": end}
+                        for start, end in pairs[i : i + batch_size]
+                    ]
+                    with metrics.timer(
+                        "neo4j_query_seconds", query="shortest_paths"
+                    ):
+                        for record in session.run(path_query, pairs=batch):
+                            paths[(record["start"], record["end"])] = (
+                                record["path"] or []
+                            )
+        results = []
+        for start, end in pairs:
+            path = [start] if start == end else paths.get((start, end), [])
+            results.append(
+                {
+                    "start": start,
+                    "end": end,
+                    "path": path,
+                    "degrees": (len(path) - 1) // 2 if path else None,
+                }
+            )
+        return results
@@ -0,0 +1,259 @@
+import os
+import json
+import logging
+import redis
+from artist_index import normalize_name
+
+logger = logging.getLogger()
+DAY = 24 * 60 * 60
+PREFIX = "six_degrees:"
+
+
+class PathCache:
+    """Redis cache of shortest paths and artist name lookups shared by
+    every app instance.
+
+    Paths are keyed on the sorted pair of artist ids, so A to B and B to A
+    share an entry. Each entry records the graph version it was computed
+    on, and the version stamp is bumped whenever the graph changes, so
+    entries from an older graph read as misses without deleting anything.
+    Redis errors and unreadable entries are treated as misses, so the
+    cache can never fail a query. Any client with the redis.Redis
+    interface works, e.g. fakeredis.FakeRedis for local testing.
+    """
+
+    def __init__(
+        self: "PathCache",
+        client: redis.Redis,
+        ttl: int = DAY,
+        prefix: str = PREFIX,
+    ) -> None:
+        self._redis = client
+        self._ttl = ttl
+        self._prefix = prefix
+        self._version_key = prefix + "graph_version"
+
+    @classmethod
+    def from_env(cls: type["PathCache"]) -> "PathCache | None":
+        """Connects to the Redis server at REDIS_URL
+
+        Args:
+            cls (type[PathCache]): The PathCache class
+
+        Returns:
+            PathCache | None: The cache, or None if REDIS_URL is not set
+        """
+        url = os.getenv("REDIS_URL")
+        if url is None:
+            return None
+        ttl = int(os.getenv("REDIS_PATH_TTL", DAY))
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def _path_key(self: "PathCache", start_id: str, end_id: str) -> str:
+        first, second = sorted((start_id, end_id))
+        return f"{self._prefix}path:{first}:{second}"
+
+    def _artist_key(self: "PathCache", name: str) -> str | None:
+        key = normalize_name(name)
+        # names of only punctuation would all share one entry
+        return f"{self._prefix}artist:{key}" if key else None
+
+    def version(self: "PathCache") -> int | None:
+        """Gets the current graph version
+
+        Args:
+            self (PathCache): Instance of PathCache
+
+        Returns:
+            int | None: The version, 0 if the graph was never versioned,
+            or None if Redis is unreachable
+        """
+        try:
+            return int(self._redis.get(self._version_key) or 0)
+        except redis.RedisError as e:
+            logger.warning("Path cache unavailable: %s", e)
+            return None
+
+    def bump_version(self: "PathCache") -> int:
+        """Invalidates every cached entry, e.g. after an import or refresh
+
+        Args:
+            self (PathCache): Instance of PathCache
+
+        Returns:
+            int: The new graph version
+        """
+        try:
+            version = self._redis.incr(self._version_key)
+        except redis.RedisError as e:
+            logger.warning("Path cache unavailable: %s", e)
+            return 0
+        logger.info("Graph version is now %s", version)
+        return version
+
+    def _get_many(
+        self: "PathCache", keys: list[str]
+    ) -> tuple[list, int | None]:
+        """Reads entries along with the graph version in one round trip
+
+        Args:
+            self (PathCache): Instance of PathCache
+            keys (list[str]): The entry keys
+
+        Returns:
+            tuple[list, int | None]: The value of each entry, or None if it
+            is missing or stale, and the graph version, or None if Redis is
+            unreachable
+        """
+        try:
+            version, *entries = self._redis.mget([self._version_key, *keys])
+        except redis.RedisError as e:
+            logger.warning("Path cache unavailable: %s", e)
+            return [None] * len(keys), None
+        version = int(version or 0)
+        values = []
+        for entry in entries:
+            value = None
+            if entry is not None:
+                try:
+                    entry = json.loads(entry)
+                    if entry["version"] == version:
+                        value = entry["value"]
+                except (ValueError, TypeError, KeyError):
+                    # a corrupt entry, or a foreign one under the prefix
+                    logger.debug("Unreadable path cache entry: %r", entry)
+            values.append(value)
+        return values, version
+
+    def _set_many(self: "PathCache", items: dict, version: int) -> None:
+        """Writes entries stamped with the graph version they were read at
+
+        Args:
+            self (PathCache): Instance of PathCache
+            items (dict): The values, by key
+            version (int): The graph version
+        """
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            for key, value in items.items():
+                entry = json.dumps({"version": version, "value": value})
+                pipeline.set(key, entry, ex=self._ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning("Path cache unavailable: %s", e)
+
+    def get_paths(
+        self: "PathCache", pairs: list
+    ) -> tuple[list, int | None]:
+        """Gets the cached paths between pairs of artists
+
+        Args:
+            self (PathCache): Instance of PathCache
+            pairs (list): (start_id, end_id) tuples
+
+        Returns:
+            tuple[list, int | None]: For each pair in order, the ids of the
+            alternating artist and track nodes from start to end, or None on
+            a miss, with an empty path caching "no path". Then the graph
+            version they were read at, to pass to set_paths for the misses
+            so a path computed while the graph changed is not cached as
+            current
+        """
+        keys = [self._path_key(start, end) for start, end in pairs]
+        cached, version = self._get_many(keys)
+        paths = []
+        for (start, _), path in zip(pairs, cached):
+            if path and path[0] != start:
+                path = path[::-1]
+            paths.append(path)
+        return paths, version
+
+    def get_path(
+        self: "PathCache", start_id: str, end_id: str
+    ) -> tuple[list | None, int | None]:
+        """Gets the cached path between two artists
+
+        Args:
+            self (PathCache): Instance of PathCache
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+
+        Returns:
+            tuple[list | None, int | None]: The path from start to end, or
+            None on a miss, and the graph version it was read at
+        """
+        paths, version = self.get_paths([(start_id, end_id)])
+        return paths[0], version
+
+    def set_paths(self: "PathCache", paths: list, version: int | None) -> None:
+        """Caches paths between pairs of artists
+
+        Args:
+            self (PathCache): Instance of PathCache
+            paths (list): (start_id, end_id, path) tuples
+            version (int | None): The graph version returned by get_paths
+            before the paths were computed. Nothing is cached if it is None
+        """
+        if version is None:
+            return
+        self._set_many(
+            {
+                self._path_key(start, end): path
+                for start, end, path in paths
+            },
+            version,
+        )
+
+    def set_path(
+        self: "PathCache",
+        start_id: str,
+        end_id: str,
+        path: list,
+        version: int | None,
+    ) -> None:
+        """Caches the path between two artists
+
+        Args:
+            self (PathCache): Instance of PathCache
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+            path (list): The path from start to end, empty if there is none
+            version (int | None): The graph version returned by get_path
+            before the path was computed
+        """
+        self.set_paths([(start_id, end_id, path)], version)
+
+    def get_artist(
+        self: "PathCache", name: str
+    ) -> tuple[str | None, int | None]:
+        """Gets the cached artist id of a name
+
+        Args:
+            self (PathCache): Instance of PathCache
+            name (str): The artist name
+
+        Returns:
+            tuple[str | None, int | None]: The artist id, or None on a miss,
+            and the graph version it was read at
+        """
+        key = self._artist_key(name)
+        if key is None:
+            return None, None
+        artist_ids, version = self._get_many([key])
+        return artist_ids[0], version
+
+    def set_artist(
+        self: "PathCache", name: str, artist_id: str, version: int | None
+    ) -> None:
+        """Caches the artist id of a name
+
+        Args:
+            self (PathCache): Instance of PathCache
+            name (str): The artist name
+            artist_id (str): The artist id
+            version (int | None): The graph version returned by get_artist
+        """
+        if version is not None:
+            key = self._artist_key(name)
+            if key is not None:
+                self._set_many({key: artist_id}, version)
@@ -0,0 +1,572 @@
+import heapq
+import math
+from array import array
+from typing import Callable, Mapping, Sequence
+from file_utilities import read_artist_csv, read_track_csv
+
+# edge costs by name, from the indexes of the two artists; the track
+# filter keeps one track per pair, so only hops are built in
+WEIGHTS = {
+    "hops": lambda artist, other: 1.0,
+}
+
+
+class PathEngine:
+    """In-process collaboration graph answering shortest path queries
+
+    Artists are numbered 0..n-1 and their collaborations are stored in
+    CSR form: the neighbors of artist i are neighbors[offsets[i]:
+    offsets[i + 1]], and edge_tracks holds the index of the connecting track
+    for each of those edges. The tables can be lists and arrays, or any
+    sequences of the same shape, such as views into a memory-mapped
+    snapshot.
+    """
+
+    def __init__(
+        self: "PathEngine",
+        artist_ids: Sequence[str],
+        artist_names: Sequence[str],
+        track_ids: Sequence[str],
+        track_names: Sequence[str],
+        offsets: Sequence[int],
+        neighbors: Sequence[int],
+        edge_tracks: Sequence[int],
+        index: Mapping[str, int] | None = None,
+    ) -> None:
+        self.artist_ids = artist_ids
+        self.artist_names = artist_names
+        self.track_ids = track_ids
+        self.track_names = track_names
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.edge_tracks = edge_tracks
+        if index is None:
+            index = {artist_id: i for i, artist_id in enumerate(artist_ids)}
+        self._index = index
+
+    @classmethod
+    def from_data(
+        cls: type["PathEngine"], artists: list, tracks: list
+    ) -> "PathEngine":
+        """Builds the engine from artist and track records
+
+        Args:
+            cls (type[PathEngine]): The PathEngine class
+            artists (list): Artists, as read by read_artist_csv
+            tracks (list): Tracks, as read by read_track_csv
+
+        Returns:
+            PathEngine: The engine
+        """
+        artist_ids = [artist["id"] for artist in artists]
+        artist_names = [artist["name"] for artist in artists]
+        index = {artist_id: i for i, artist_id in enumerate(artist_ids)}
+
+        track_ids = []
+        track_names = []
+        members = []
+        degrees = [0] * len(artist_ids)
+        for track in tracks:
+            included = [index[a] for a in track["artists"] if a in index]
+            if len(included) < 2:
+                continue
+            track_ids.append(track["id"])
+            track_names.append(track["name"])
+            members.append(included)
+            for artist in included:
+                degrees[artist] += len(included) - 1
+
+        offsets = array("q", [0]) * (len(artist_ids) + 1)
+        for i, degree in enumerate(degrees):
+            offsets[i + 1] = offsets[i] + degree
+        neighbors = array("i", [0]) * offsets[-1]
+        edge_tracks = array("i", [0]) * offsets[-1]
+        cursor = array("q", offsets[:-1])
+        for track, included in enumerate(members):
+            for artist in included:
+                for other in included:
+                    if other == artist:
+                        continue
+                    neighbors[cursor[artist]] = other
+                    edge_tracks[cursor[artist]] = track
+                    cursor[artist] += 1
+
+        return cls(
+            artist_ids,
+            artist_names,
+            track_ids,
+            track_names,
+            offsets,
+            neighbors,
+            edge_tracks,
+            index,
+        )
+
+    @classmethod
+    def from_csv(
+        cls: type["PathEngine"],
+        artist_path: str = "data/artists.csv",
+        track_path: str = "data/tracks.csv",
+    ) -> "PathEngine":
+        """Builds the engine from the artist and track CSV files
+
+        Args:
+            cls (type[PathEngine]): The PathEngine class
+            artist_path (str, optional): The path to the artist file.
+            Defaults to "data/artists.csv".
+            track_path (str, optional): The path to the track file. Defaults
+            to "data/tracks.csv".
+
+        Returns:
+            PathEngine: The engine
+        """
+        return cls.from_data(
+            read_artist_csv(artist_path), read_track_csv(track_path)
+        )
+
+    def __contains__(self: "PathEngine", artist_id: str) -> bool:
+        return self._index.get(artist_id) is not None
+
+    def __len__(self: "PathEngine") -> int:
+        return len(self.artist_ids)
+
+    def artist_index(self: "PathEngine", artist_id: str) -> int | None:
+        """Gets the integer index of an artist
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            artist_id (str): The Spotify artist id
+
+        Returns:
+            int | None: The index, or None if the artist is not in the graph
+        """
+        return self._index.get(artist_id)
+
+    def shortest_path(self: "PathEngine", start_id: str, end_id: str) -> list:
+        """Finds the shortest path between two artists, if it exists
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+
+        Returns:
+            list: The ids of the alternating artist and track nodes on the
+            path, in the same shape as Neo4jClient.shortest_path, or an empty
+            list if there is no path
+        """
+        start = self._index.get(start_id)
+        end = self._index.get(end_id)
+        if start is None or end is None:
+            return []
+        hops = self.shortest_hops(start, end)
+        if hops is None:
+            return []
+        path = [self.artist_ids[start]]
+        for track, artist in hops:
+            path.append(self.track_ids[track])
+            path.append(self.artist_ids[artist])
+        return path
+
+    def shortest_paths(self: "PathEngine", pairs: list) -> list[dict]:
+        """Finds the shortest paths between many pairs of artists
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            pairs (list): (start_id, end_id) tuples
+
+        Returns:
+            list[dict]: For each pair in order, its start and end ids, the
+            ids of the alternating artist and track nodes on the path (empty
+            if there is none) and its degrees of separation (None if there
+            is no path)
+        """
+        results = []
+        for start, end in pairs:
+            path = self.shortest_path(start, end)
+            results.append(
+                {
+                    "start": start,
+                    "end": end,
+                    "path": path,
+                    "degrees": (len(path) - 1) // 2 if path else None,
+                }
+            )
+        return results
+
+    def shortest_hops(
+        self: "PathEngine",
+        start: int,
+        end: int,
+        max_hops: int | None = None,
+    ) -> list[tuple[int, int]] | None:
+        """Runs a bidirectional BFS between two artist indexes
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            start (int): Index of the starting artist
+            end (int): Index of the ending artist
+            max_hops (int | None, optional): Stop searching once no path of
+            at most this many hops is left to find. Defaults to None.
+
+        Returns:
+            list[tuple[int, int]] | None: (track, artist) index pairs for
+            each hop after the start, or None if there is no path
+        """
+        if start == end:
+            return []
+        offsets = self.offsets
+        neighbors = self.neighbors
+        edge_tracks = self.edge_tracks
+
+        # parent maps: artist -> (previous artist, connecting track)
+        forward = {start: (-1, -1)}
+        backward = {end: (-1, -1)}
+        forward_dist = {start: 0}
+        backward_dist = {end: 0}
+        forward_frontier = [start]
+        backward_frontier = [end]
+        # levels expanded on both sides, so the next meeting is one longer
+        searched = 0
+
+        while forward_frontier and backward_frontier:
+            if max_hops is not None and searched >= max_hops:
+                return None
+            expand_forward = len(forward_frontier) <= len(backward_frontier)
+            if expand_forward:
+                frontier, parents, dist = (
+                    forward_frontier,
+                    forward,
+                    forward_dist,
+                )
+                other_dist = backward_dist
+            else:
+                frontier, parents, dist = (
+                    backward_frontier,
+                    backward,
+                    backward_dist,
+                )
+                other_dist = forward_dist
+
+            best = None
+            next_frontier = []
+            for artist in frontier:
+                depth = dist[artist] + 1
+                for edge in range(offsets[artist], offsets[artist + 1]):
+                    other = neighbors[edge]
+                    if other in other_dist:
+                        length = depth + other_dist[other]
+                        if best is None or length < best[0]:
+                            best = (length, artist, other, edge_tracks[edge])
+                    if other not in parents:
+                        parents[other] = (artist, edge_tracks[edge])
+                        dist[other] = depth
+                        next_frontier.append(other)
+            if best is not None:
+                _, artist, other, track = best
+                if expand_forward:
+                    return self._join(forward, backward, artist, other, track)
+                return self._join(forward, backward, other, artist, track)
+
+            if expand_forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+            searched += 1
+        return None
+
+    @staticmethod
+    def _join(
+        forward: dict, backward: dict, left: int, right: int, track: int
+    ) -> list[tuple[int, int]]:
+        """Joins the two halves of a bidirectional search at an edge
+
+        Args:
+            forward (dict): Parent map of the search from the start
+            backward (dict): Parent map of the search from the end
+            left (int): Artist on the start side of the meeting edge
+            right (int): Artist on the end side of the meeting edge
+            track (int): Track connecting left and right
+
+        Returns:
+            list[tuple[int, int]]: (track, artist) pairs for each hop
+        """
+        hops = []
+        artist = left
+        while forward[artist][0] != -1:
+            previous, via = forward[artist]
+            hops.append((via, artist))
+            artist = previous
+        hops.reverse()
+        hops.append((track, right))
+        artist = right
+        while backward[artist][0] != -1:
+            following, via = backward[artist]
+            hops.append((via, following))
+            artist = following
+        return hops
+
+    def _collaborators(self: "PathEngine", artist: int) -> dict:
+        """Groups an artist's edges by collaborator
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            artist (int): Index of the artist
+
+        Returns:
+            dict: The first connecting track by collaborator index
+        """
+        collaborators = {}
+        for edge in range(self.offsets[artist], self.offsets[artist + 1]):
+            collaborators.setdefault(
+                self.neighbors[edge], self.edge_tracks[edge]
+            )
+        return collaborators
+
+    def _search(
+        self: "PathEngine",
+        start: int,
+        end: int,
+        cost: Callable[[int, int], float],
+        heuristic: Callable[[int], float] | None = None,
+        banned_artists: set | frozenset = frozenset(),
+        banned_edges: set | frozenset = frozenset(),
+        max_cost: float = math.inf,
+    ) -> tuple[float, list, list, list] | None:
+        """Finds the cheapest path between two artist indexes with Dijkstra,
+        or A* when given a heuristic, stopping as soon as the end artist is
+        settled. Branches that cannot beat max_cost are pruned
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            start (int): Index of the starting artist
+            end (int): Index of the ending artist
+            cost (Callable[[int, int], float]): Non-negative cost of an
+            edge, from the two artists
+            heuristic (Callable[[int], float] | None, optional): Lower
+            bound on the cost from an artist to the end. Defaults to None.
+            banned_artists (set | frozenset, optional): Artists the path
+            may not visit. Defaults to frozenset().
+            banned_edges (set | frozenset, optional): (artist, other)
+            edges the path may not take. Defaults to frozenset().
+            max_cost (float, optional): Only paths cheaper than this are
+            returned. Defaults to math.inf.
+
+        Returns:
+            tuple[float, list, list, list] | None: The cost, the artist
+            indexes, the connecting track indexes and the cost of each
+            edge, or None if there is no path under max_cost
+        """
+        if heuristic is None:
+            heuristic = lambda artist: 0.0  # noqa: E731
+        best = {start: 0.0}
+        parents = {start: (-1, -1, 0.0)}
+        settled = set()
+        queue = [(heuristic(start), 0.0, start)]
+        while queue:
+            _, distance, artist = heapq.heappop(queue)
+            if artist in settled:
+                continue
+            if artist == end:
+                artists, tracks, costs = [end], [], []
+                while parents[artist][0] != -1:
+                    previous, track, edge_cost = parents[artist]
+                    artists.append(previous)
+                    tracks.append(track)
+                    costs.append(edge_cost)
+                    artist = previous
+                artists.reverse()
+                tracks.reverse()
+                costs.reverse()
+                return distance, artists, tracks, costs
+            settled.add(artist)
+            for other, track in self._collaborators(artist).items():
+                if other in settled or other in banned_artists:
+                    continue
+                if (artist, other) in banned_edges:
+                    continue
+                edge_cost = cost(artist, other)
+                candidate = distance + edge_cost
+                if candidate >= best.get(other, math.inf):
+                    continue
+                estimate = candidate + heuristic(other)
+                if estimate >= max_cost:
+                    continue
+                best[other] = candidate
+                parents[other] = (artist, track, edge_cost)
+                heapq.heappush(queue, (estimate, candidate, other))
+        return None
+
+    def _record(
+        self: "PathEngine",
+        total: float,
+        artists: list,
+        tracks: list,
+        costs: list,
+    ) -> dict:
+        """Describes a path with ids and names
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            total (float): The cost of the path
+            artists (list): The artist indexes on the path
+            tracks (list): The connecting track indexes
+            costs (list): The cost of each edge
+
+        Returns:
+            dict: The cost, the degrees of separation, and a record of each
+            hop with the artists and track it connects and its cost
+        """
+        hops = []
+        for i, track in enumerate(tracks):
+            artist, other = artists[i], artists[i + 1]
+            hops.append(
+                {
+                    "from_id": self.artist_ids[artist],
+                    "from_name": self.artist_names[artist],
+                    "track_id": self.track_ids[track],
+                    "track_name": self.track_names[track],
+                    "to_id": self.artist_ids[other],
+                    "to_name": self.artist_names[other],
+                    "cost": costs[i],
+                }
+            )
+        return {"cost": total, "degrees": len(tracks), "hops": hops}
+
+    def _cost(
+        self: "PathEngine", weight: str | Callable[[int, int], float]
+    ) -> Callable[[int, int], float]:
+        """Resolves a weight name to its edge cost function
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            weight (str | Callable[[int, int], float]): A name from
+            WEIGHTS, or a cost function
+
+        Raises:
+            ValueError: If the weight name is unknown
+
+        Returns:
+            Callable[[int, int], float]: The cost function
+        """
+        if callable(weight):
+            return weight
+        if weight not in WEIGHTS:
+            raise ValueError(f"Unknown weight: {weight}")
+        return WEIGHTS[weight]
+
+    def weighted_path(
+        self: "PathEngine",
+        start_id: str,
+        end_id: str,
+        weight: str | Callable[[int, int], float] = "hops",
+        heuristic: Callable[[int], float] | None = None,
+    ) -> dict | None:
+        """Finds the cheapest path between two artists under an edge weight
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+            weight (str | Callable[[int, int], float], optional): A
+            name from WEIGHTS, or a non-negative cost function of the two
+            artist indexes. Defaults to "hops".
+            heuristic (Callable[[int], float] | None, optional): An
+            admissible lower bound on the cost from an artist index to the
+            end, which turns the search into A*. Defaults to None.
+
+        Returns:
+            dict | None: The path, with a record per hop, or None if there
+            is no path
+        """
+        start = self._index.get(start_id)
+        end = self._index.get(end_id)
+        if start is None or end is None:
+            return None
+        found = self._search(start, end, self._cost(weight), heuristic)
+        return None if found is None else self._record(*found)
+
+    def k_shortest_paths(
+        self: "PathEngine",
+        start_id: str,
+        end_id: str,
+        k: int = 3,
+        weight: str | Callable[[int, int], float] = "hops",
+    ) -> list[dict]:
+        """Finds the k cheapest loopless paths between two artists with
+        Yen's algorithm. Each round only branches off the new path after
+        the point where it left its parent, and once enough candidates are
+        queued, spur searches are pruned at the cost of the worst one still
+        needed
+
+        Args:
+            self (PathEngine): Instance of PathEngine
+            start_id (str): id of the starting artist
+            end_id (str): id of the ending artist
+            k (int, optional): The number of paths. Defaults to 3.
+            weight (str | Callable[[int, int], float], optional): A
+            name from WEIGHTS, or a cost function. Defaults to "hops".
+
+        Returns:
+            list[dict]: Up to k paths, cheapest first, each with a record
+            per hop
+        """
+        start = self._index.get(start_id)
+        end = self._index.get(end_id)
+        if start is None or end is None or k < 1:
+            return []
+        cost = self._cost(weight)
+        first = self._search(start, end, cost)
+        if first is None:
+            return []
+        # (cost, artists, tracks, costs, index the path branched off at)
+        found = [(*first, 0)]
+        seen = {tuple(first[1])}
+        candidates = []
+        while len(found) < k:
+            _, artists, tracks, costs, branched = found[-1]
+            needed = k - len(found)
+            for i in range(branched, len(artists) - 1):
+                root = artists[: i + 1]
+                banned_edges = {
+                    (path[1][i], path[1][i + 1])
+                    for path in found
+                    if path[1][: i + 1] == root
+                }
+                root_cost = sum(costs[:i])
+                max_cost = math.inf
+                if len(candidates) >= needed:
+                    worst = heapq.nsmallest(needed, candidates)[-1][0]
+                    max_cost = worst - root_cost
+                spur = self._search(
+                    artists[i],
+                    end,
+                    cost,
+                    banned_artists=set(root[:-1]),
+                    banned_edges=banned_edges,
+                    max_cost=max_cost,
+                )
+                if spur is None:
+                    continue
+                spur_cost, spur_artists, spur_tracks, spur_costs = spur
+                path_artists = root[:-1] + spur_artists
+                if tuple(path_artists) in seen:
+                    continue
+                seen.add(tuple(path_artists))
+                heapq.heappush(
+                    candidates,
+                    (
+                        root_cost + spur_cost,
+                        path_artists,
+                        tracks[:i] + spur_tracks,
+                        costs[:i] + spur_costs,
+                        i,
+                    ),
+                )
+            if not candidates:
+                break
+            found.append(heapq.heappop(candidates))
+        return [
+            self._record(total, artists, tracks, costs)
+            for total, artists, tracks, costs, _ in found
+        ]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by concurrent Spotify requests.
+
+    The refill rate adapts to the API: a 429 pauses every caller for the
+    Retry-After period and halves the rate, and each success afterwards
+    recovers it additively towards the configured maximum.
+    """
+
+    def __init__(
+        self: "RateLimiter",
+        rate: float = 10.0,
+        capacity: int | None = None,
+        min_rate: float = 0.5,
+        recovery: float = 0.05,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._recovery = recovery
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self: "RateLimiter") -> float:
+        """Takes a token if one is available
+
+        Args:
+            self (RateLimiter): Instance of RateLimiter
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise the seconds to wait
+            before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self: "RateLimiter") -> None:
+        """Blocks until a request may be sent
+
+        Args:
+            self (RateLimiter): Instance of RateLimiter
+        """
+        while wait := self._reserve():
+            time.sleep(wait)
+
+    async def acquire_async(self: "RateLimiter") -> None:
+        """Waits without blocking the event loop until a request may be
+        sent. Shares its tokens with acquire
+
+        Args:
+            self (RateLimiter): Instance of RateLimiter
+        """
+        while wait := self._reserve():
+            await asyncio.sleep(wait)
+
+    def penalize(self: "RateLimiter", retry_after: float) -> None:
+        """Backs off after a 429 response
+
+        Args:
+            self (RateLimiter): Instance of RateLimiter
+            retry_after (float): Seconds the API asked us to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+    def reward(self: "RateLimiter") -> None:
+        """Recovers the rate after a successful request
+
+        Args:
+            self (RateLimiter): Instance of RateLimiter
+        """
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self._recovery)
@@ -0,0 +1,302 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+DAY = 24 * 60 * 60
+DEFAULT_TTLS = {
+    "artist": 7 * DAY,
+    "artists": 7 * DAY,
+    "search": 7 * DAY,
+    # kept under a day so nightly refreshes see new releases
+    "artist_albums": DAY // 2,
+    "album_tracks": 30 * DAY,
+    "albums": 30 * DAY,
+}
+
+
+def cache_key(params: dict) -> str:
+    """Builds a stable cache key from request parameters
+
+    Args:
+        params (dict): The request parameters
+
+    Returns:
+        str: The cache key
+    """
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseCache(ABC):
+    """Base class for Spotify response caches, keyed by endpoint and
+    parameters. Subclasses implement _load and _store."""
+
+    def __init__(
+        self: "ResponseCache", ttls: dict | None = None, default_ttl: int = DAY
+    ) -> None:
+        self._ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self: "ResponseCache", endpoint: str) -> int:
+        """Gets the time to live of an endpoint's responses
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+            endpoint (str): The endpoint name
+
+        Returns:
+            int: The time to live in seconds
+        """
+        return self._ttls.get(endpoint, self._default_ttl)
+
+    def get(self: "ResponseCache", endpoint: str, params: dict) -> Any:
+        """Gets a cached response
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+            endpoint (str): The endpoint name
+            params (dict): The request parameters
+
+        Returns:
+            Any: The response, or None on a miss
+        """
+        value = self._load(endpoint, cache_key(params), time.time())
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(
+        self: "ResponseCache", endpoint: str, params: dict, value: Any
+    ) -> int | None:
+        """Caches a response
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+            endpoint (str): The endpoint name
+            params (dict): The request parameters
+            value (Any): The response
+
+        Returns:
+            int | None: The size of the stored JSON in bytes, or None if
+            the cache does not serialize responses
+        """
+        expires_at = time.time() + self.ttl(endpoint)
+        return self._store(endpoint, cache_key(params), value, expires_at)
+
+    def stats(self: "ResponseCache") -> dict:
+        """Gets the hit and miss counters
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+
+        Returns:
+            dict: The hits, misses and hit rate
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    @abstractmethod
+    def _load(
+        self: "ResponseCache", endpoint: str, key: str, now: float
+    ) -> Any:
+        """Reads an entry that has not expired
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+            endpoint (str): The endpoint name
+            key (str): The cache key
+            now (float): The current time
+
+        Returns:
+            Any: The response, or None on a miss
+        """
+
+    @abstractmethod
+    def _store(
+        self: "ResponseCache",
+        endpoint: str,
+        key: str,
+        value: Any,
+        expires_at: float,
+    ) -> int | None:
+        """Writes an entry
+
+        Args:
+            self (ResponseCache): Instance of ResponseCache
+            endpoint (str): The endpoint name
+            key (str): The cache key
+            value (Any): The response
+            expires_at (float): When the entry expires
+
+        Returns:
+            int | None: The size of the stored JSON in bytes, or None if
+            the cache does not serialize responses
+        """
+
+
+class MemoryCache(ResponseCache):
+    """Response cache held in process memory"""
+
+    def __init__(
+        self: "MemoryCache",
+        ttls: dict | None = None,
+        default_ttl: int = DAY,
+        max_entries: int = 10000,
+    ) -> None:
+        super().__init__(ttls, default_ttl)
+        self._max_entries = max_entries
+        self._entries = {}
+
+    def _load(self: "MemoryCache", endpoint: str, key: str, now: float) -> Any:
+        with self._lock:
+            entry = self._entries.pop((endpoint, key), None)
+            if entry is None or entry[1] <= now:
+                return None
+            # re-insert so dict order tracks recency of use
+            self._entries[(endpoint, key)] = entry
+            return entry[0]
+
+    def _store(
+        self: "MemoryCache",
+        endpoint: str,
+        key: str,
+        value: Any,
+        expires_at: float,
+    ) -> None:
+        with self._lock:
+            self._entries.pop((endpoint, key), None)
+            self._entries[(endpoint, key)] = (value, expires_at)
+            while len(self._entries) > self._max_entries:
+                del self._entries[next(iter(self._entries))]
+
+
+class SQLiteCache(ResponseCache):
+    """Response cache persisted to a SQLite database, evicting expired and
+    least recently used entries once it grows past max_entries"""
+
+    def __init__(
+        self: "SQLiteCache",
+        path: str = "data/spotify_cache.sqlite",
+        ttls: dict | None = None,
+        default_ttl: int = DAY,
+        max_entries: int = 200000,
+    ) -> None:
+        super().__init__(ttls, default_ttl)
+        self._max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # WAL stays consistent without syncing every commit, so the
+            # access time update on each hit is not a disk flush
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "endpoint TEXT NOT NULL, "
+                "key TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (endpoint, key))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+                "ON responses (accessed_at)"
+            )
+            self._count = self._conn.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    def close(self: "SQLiteCache") -> None:
+        """Closes the database connection
+
+        Args:
+            self (SQLiteCache): Instance of SQLiteCache
+        """
+        with self._lock:
+            self._conn.close()
+
+    def _load(self: "SQLiteCache", endpoint: str, key: str, now: float) -> Any:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses "
+                "WHERE endpoint = ? AND key = ?",
+                (endpoint, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE endpoint = ? AND key = ?",
+                    (endpoint, key),
+                )
+                self._count -= 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? "
+                "WHERE endpoint = ? AND key = ?",
+                (now, endpoint, key),
+            )
+        return json.loads(row[0])
+
+    def _store(
+        self: "SQLiteCache",
+        endpoint: str,
+        key: str,
+        value: Any,
+        expires_at: float,
+    ) -> int:
+        data = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (endpoint, key, data, expires_at, now),
+            )
+            if cursor.rowcount:
+                self._count += 1
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET value = ?, expires_at = ?, "
+                    "accessed_at = ? WHERE endpoint = ? AND key = ?",
+                    (data, expires_at, now, endpoint, key),
+                )
+            if self._count > self._max_entries:
+                self._evict(now)
+        # json.dumps escapes non-ASCII, so characters are bytes
+        return len(data)
+
+    def _evict(self: "SQLiteCache", now: float) -> None:
+        """Drops expired entries, then the least recently used ones, down
+        to nine tenths of max_entries so eviction runs in bulk
+
+        Args:
+            self (SQLiteCache): Instance of SQLiteCache
+            now (float): The current time
+        """
+        self._conn.execute(
+            "DELETE FROM responses WHERE expires_at <= ?", (now,)
+        )
+        self._count = self._conn.execute(
+            "SELECT COUNT(*) FROM responses"
+        ).fetchone()[0]
+        target = self._max_entries * 9 // 10
+        if self._count > target:
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN ("
+                "SELECT rowid FROM responses "
+                "ORDER BY accessed_at LIMIT ?)",
+                (self._count - target,),
+            )
+            self._count = target
@@ -0,0 +1,216 @@
+import random
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from graph_snapshot import load_snapshot
+from path_engine import PathEngine
+
+# engine used by the worker processes, set by _init_worker
+_worker_engine = None
+
+
+def bfs_levels(engine: PathEngine, source: int) -> Counter:
+    """Counts the artists at each distance from a source artist
+
+    Args:
+        engine (PathEngine): The path engine
+        source (int): Index of the source artist
+
+    Returns:
+        Counter: Number of artists per degree of separation, excluding the
+        source itself
+    """
+    offsets = engine.offsets
+    neighbors = engine.neighbors
+    visited = bytearray(len(engine.artist_ids))
+    visited[source] = 1
+    frontier = [source]
+    levels = Counter()
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for artist in frontier:
+            for edge in range(offsets[artist], offsets[artist + 1]):
+                other = neighbors[edge]
+                if not visited[other]:
+                    visited[other] = 1
+                    next_frontier.append(other)
+        if next_frontier:
+            levels[depth] = len(next_frontier)
+        frontier = next_frontier
+    return levels
+
+
+def largest_component(engine: PathEngine) -> tuple[bytearray, int]:
+    """Labels the connected components with a BFS from each unlabeled
+    artist and marks the artists of the largest one
+
+    Args:
+        engine (PathEngine): The path engine
+
+    Returns:
+        tuple[bytearray, int]: 1 for each artist in the largest component
+        and 0 otherwise, and the size of that component
+    """
+    offsets = engine.offsets
+    neighbors = engine.neighbors
+    components = array("i", [-1]) * len(engine.artist_ids)
+    sizes = []
+    for root in range(len(components)):
+        if components[root] >= 0:
+            continue
+        label = len(sizes)
+        components[root] = label
+        reached = [root]
+        for artist in reached:
+            for edge in range(offsets[artist], offsets[artist + 1]):
+                other = neighbors[edge]
+                if components[other] < 0:
+                    components[other] = label
+                    reached.append(other)
+        sizes.append(len(reached))
+    if not sizes:
+        return bytearray(), 0
+    largest = max(range(len(sizes)), key=sizes.__getitem__)
+    marks = bytearray(component == largest for component in components)
+    return marks, sizes[largest]
+
+
+def _init_worker(snapshot_path: str | None, tables: tuple | None) -> None:
+    """Loads the engine in a worker process, memory-mapping the snapshot
+    when there is one so every worker shares its pages
+
+    Args:
+        snapshot_path (str | None): The path to the graph snapshot
+        tables (tuple | None): The engine's CSR tables, used when there is
+        no snapshot
+    """
+    global _worker_engine
+    if snapshot_path is not None:
+        _worker_engine = load_snapshot(snapshot_path)
+    else:
+        artist_ids, offsets, neighbors = tables
+        _worker_engine = PathEngine(
+            artist_ids, [], [], [], offsets, neighbors, array("i")
+        )
+
+
+def _run_sources(sources: list) -> tuple[Counter, list]:
+    """Runs a BFS from each source in a worker process
+
+    Args:
+        sources (list): Indexes of the source artists
+
+    Returns:
+        tuple[Counter, list]: The summed distance histogram and the
+        (source, eccentricity) pairs
+    """
+    return _sources_report(_worker_engine, sources)
+
+
+def _sources_report(engine: PathEngine, sources: list) -> tuple[Counter, list]:
+    """Runs a BFS from each source artist
+
+    Args:
+        engine (PathEngine): The path engine
+        sources (list): Indexes of the source artists
+
+    Returns:
+        tuple[Counter, list]: The summed distance histogram and the
+        (source, eccentricity) pairs
+    """
+    histogram = Counter()
+    eccentricities = []
+    for source in sources:
+        levels = bfs_levels(engine, source)
+        histogram.update(levels)
+        eccentricities.append((source, max(levels, default=0)))
+    return histogram, eccentricities
+
+
+def separation_report(
+    engine: PathEngine,
+    sample: int | None = None,
+    workers: int = 1,
+    snapshot_path: str | None = None,
+    seed: int = 0,
+    chunk_size: int = 64,
+) -> dict:
+    """Computes the degrees of separation histogram and the artist
+    eccentricities with a BFS from every artist, or from a random sample
+    of artists, spread over a process pool. The diameter and radius are
+    those of the largest connected component, as small islands of
+    collaborators would otherwise set the radius
+
+    Args:
+        engine (PathEngine): The path engine
+        sample (int | None, optional): The number of source artists to
+        sample. Defaults to None, which uses every artist.
+        workers (int, optional): The number of processes. Defaults to 1.
+        snapshot_path (str | None, optional): A graph snapshot of the same
+        engine for the workers to memory-map. Defaults to None, which sends
+        the CSR tables to each worker instead.
+        seed (int, optional): The sampling seed. Defaults to 0.
+        chunk_size (int, optional): The number of sources per task.
+        Defaults to 64.
+
+    Returns:
+        dict: The number of sources, the histogram of degrees over
+        (source, reachable artist) pairs, the number of unreachable pairs,
+        the size of the largest component with the diameter and radius
+        seen from its sources, and each source's eccentricity
+    """
+    artist_count = len(engine.artist_ids)
+    sources = list(range(artist_count))
+    if sample is not None and sample < artist_count:
+        sources = sorted(random.Random(seed).sample(sources, sample))
+    chunks = [
+        sources[i : i + chunk_size]
+        for i in range(0, len(sources), chunk_size)
+    ]
+
+    in_largest, largest_size = largest_component(engine)
+    histogram = Counter()
+    eccentricities = {}
+    largest = []
+    if workers <= 1:
+        partials = (_sources_report(engine, chunk) for chunk in chunks)
+    else:
+        tables = None
+        if snapshot_path is None:
+            tables = (
+                list(engine.artist_ids),
+                array("q", engine.offsets),
+                array("i", engine.neighbors),
+            )
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(snapshot_path, tables),
+        )
+        partials = executor.map(_run_sources, chunks)
+    try:
+        for partial_histogram, partial_eccentricities in partials:
+            histogram.update(partial_histogram)
+            for source, eccentricity in partial_eccentricities:
+                eccentricities[engine.artist_ids[source]] = eccentricity
+                if in_largest[source]:
+                    largest.append(eccentricity)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+
+    reachable = sum(histogram.values())
+    return {
+        "sources": len(sources),
+        "histogram": dict(sorted(histogram.items())),
+        "unreachable": len(sources) * (artist_count - 1) - reachable,
+        "largest_component": {
+            "artists": largest_size,
+            "sources": len(largest),
+            "diameter": max(largest, default=0),
+            "radius": min(largest, default=0),
+        },
+        "eccentricities": eccentricities,
+    }
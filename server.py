@@ -0,0 +1,405 @@
+import asyncio
+import logging
+from typing import Any, Callable, Hashable
+from aiohttp import web
+from metrics import metrics
+from neo4j_client import close_driver, warm_up
+from six_degrees import SixDegrees
+
+logger = logging.getLogger()
+BATCH_SIZE = 256
+# how long the first request of a batch waits for others to join it
+BATCH_DELAY = 0.002
+BATCH_WORKERS = 4
+MAX_CONCURRENCY = 1024
+REQUEST_TIMEOUT = 10.0
+COMPLETION_LIMIT = 10
+
+
+class MicroBatcher:
+    """Groups concurrent calls into batches for a function that takes a
+    list of items and returns one result per item, run in a worker thread.
+
+    A batch is sent as soon as it is full, or once its first item has
+    waited max_delay, and identical items within a batch are only sent
+    once. Up to workers batches are in flight at a time, so requests keep
+    queueing into the next batch while the previous one runs.
+    """
+
+    def __init__(
+        self: "MicroBatcher",
+        func: Callable[[list], list],
+        name: str,
+        max_size: int = BATCH_SIZE,
+        max_delay: float = BATCH_DELAY,
+        workers: int = BATCH_WORKERS,
+    ) -> None:
+        self._func = func
+        self._name = name
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._workers = workers
+        self._queue = None
+        self._tasks = []
+
+    async def start(self: "MicroBatcher") -> None:
+        """Starts the batch workers on the running event loop
+
+        Args:
+            self (MicroBatcher): Instance of MicroBatcher
+        """
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(self._workers)
+        ]
+
+    async def stop(self: "MicroBatcher") -> None:
+        """Stops the batch workers, failing the calls still queued
+
+        Args:
+            self (MicroBatcher): Instance of MicroBatcher
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self: "MicroBatcher", item: Hashable) -> Any:
+        """Adds an item to the next batch and waits for its result
+
+        Args:
+            self (MicroBatcher): Instance of MicroBatcher
+            item (Hashable): The item
+
+        Returns:
+            Any: The result for the item
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self: "MicroBatcher") -> list:
+        """Waits for the next batch
+
+        Args:
+            self (MicroBatcher): Instance of MicroBatcher
+
+        Returns:
+            list: (item, future) tuples
+        """
+        batch = [await self._queue.get()]
+        if self._queue.qsize() < self._max_size - 1:
+            await asyncio.sleep(self._max_delay)
+        while len(batch) < self._max_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        # callers that timed out while queued cancelled their futures
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _work(self: "MicroBatcher") -> None:
+        """Runs batches until cancelled
+
+        Args:
+            self (MicroBatcher): Instance of MicroBatcher
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            items = list(dict.fromkeys(item for item, _ in batch))
+            metrics.increment("batches_total", batcher=self._name)
+            metrics.increment(
+                "batch_items_total", len(batch), batcher=self._name
+            )
+            try:
+                with metrics.timer("batch_seconds", batcher=self._name):
+                    results = await loop.run_in_executor(
+                        None, self._func, items
+                    )
+            except Exception as e:
+                logger.exception("%s batch failed", self._name)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            by_item = dict(zip(items, results))
+            for item, future in batch:
+                if not future.done():
+                    future.set_result(by_item[item])
+
+
+class PathService:
+    """HTTP service answering path, degree and artist lookups from one
+    long-running process.
+
+    The path engine, hub labels, artist index and Neo4j driver are loaded
+    once at startup and kept warm. Concurrent path and degree requests are
+    micro-batched, so a burst of requests becomes one Neo4j query or one
+    pass over the engine. Requests beyond max_concurrency are rejected with
+    a 503 and requests running past timeout with a 504.
+    """
+
+    def __init__(
+        self: "PathService",
+        six_degrees: SixDegrees,
+        use_engine: bool = False,
+        max_concurrency: int = MAX_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+        batch_size: int = BATCH_SIZE,
+        batch_delay: float = BATCH_DELAY,
+    ) -> None:
+        self._six_degrees = six_degrees
+        self._use_engine = use_engine
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self._in_flight = 0
+        self._paths = MicroBatcher(
+            self._find_paths, "paths", batch_size, batch_delay
+        )
+        self._degrees = MicroBatcher(
+            self._find_degrees, "degrees", batch_size, batch_delay
+        )
+
+    def _find_paths(self: "PathService", pairs: list) -> list[dict]:
+        return self._six_degrees.find_paths(pairs, self._use_engine)
+
+    def _find_degrees(self: "PathService", pairs: list) -> list:
+        # path batches see version bumps through the path cache lookup,
+        # degree batches check for them once per batch
+        self._six_degrees.sync_graph()
+        return [
+            self._six_degrees.degrees_of_separation(start, end)
+            for start, end in pairs
+        ]
+
+    def _match_artists(self: "PathService", name: str, limit: int) -> dict:
+        # fuzzy matching scans the index, so it runs off the event loop
+        index = self._six_degrees.load_artist_index()
+        return {
+            "match": index.resolve(name),
+            "completions": index.complete(name, limit),
+        }
+
+    def create_app(self: "PathService") -> web.Application:
+        """Builds the aiohttp application
+
+        Args:
+            self (PathService): Instance of PathService
+
+        Returns:
+            web.Application: The application
+        """
+        app = web.Application(middlewares=[self._limit])
+        app.add_routes(
+            [
+                web.get("/path", self.path, name="path"),
+                web.get("/degrees", self.degrees, name="degrees"),
+                web.get("/artists", self.artists, name="artists"),
+                web.get("/health", self.health, name="health"),
+                web.get("/metrics", self.export_metrics, name="metrics"),
+            ]
+        )
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._stop)
+        return app
+
+    async def _start(self: "PathService", app: web.Application) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._warm_up)
+        await self._paths.start()
+        await self._degrees.start()
+
+    async def _stop(self: "PathService", app: web.Application) -> None:
+        await self._paths.stop()
+        await self._degrees.stop()
+        close_driver()
+
+    def _warm_up(self: "PathService") -> None:
+        """Loads everything the requests need before serving them, so the
+        first requests do not wait on it
+
+        Args:
+            self (PathService): Instance of PathService
+        """
+        self._six_degrees.load_artist_index()
+        engine = self._six_degrees.load_engine()
+        self._six_degrees.load_labels()
+        if not self._use_engine:
+            warm_up()
+        logger.info("Serving %s artists", len(engine))
+
+    @web.middleware
+    async def _limit(
+        self: "PathService", request: web.Request, handler: Callable
+    ) -> web.StreamResponse:
+        """Sheds requests over the concurrency limit and times out slow
+        ones, recording the latency of each endpoint
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+            handler (Callable): The route handler
+
+        Raises:
+            web.HTTPServiceUnavailable: If too many requests are in flight
+            web.HTTPGatewayTimeout: If the request takes too long
+
+        Returns:
+            web.StreamResponse: The response
+        """
+        endpoint = request.match_info.route.name or "unknown"
+        if self._in_flight >= self._max_concurrency:
+            metrics.increment("http_rejected_total", endpoint=endpoint)
+            raise web.HTTPServiceUnavailable(text="Too many requests")
+        self._in_flight += 1
+        try:
+            with metrics.timer("http_request_seconds", endpoint=endpoint):
+                return await asyncio.wait_for(
+                    handler(request), self._timeout
+                )
+        except asyncio.TimeoutError:
+            metrics.increment("http_timeouts_total", endpoint=endpoint)
+            raise web.HTTPGatewayTimeout(text="Request timed out")
+        finally:
+            self._in_flight -= 1
+
+    @staticmethod
+    def _pair(request: web.Request) -> tuple[str, str]:
+        """Reads the start and end artist names of a request
+
+        Args:
+            request (web.Request): The request
+
+        Raises:
+            web.HTTPBadRequest: If either name is missing
+
+        Returns:
+            tuple[str, str]: The start and end names
+        """
+        start = request.query.get("start", "").strip()
+        end = request.query.get("end", "").strip()
+        if not start or not end:
+            raise web.HTTPBadRequest(text="start and end are required")
+        return start, end
+
+    async def path(self: "PathService", request: web.Request) -> web.Response:
+        """GET /path?start=<name>&end=<name>: the shortest path between two
+        artists, as returned by SixDegrees.find_paths. Unknown artists have
+        a None id and a 404 status
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+
+        Returns:
+            web.Response: The JSON response
+        """
+        result = await self._paths.submit(self._pair(request))
+        status = 404 if None in (result["start"], result["end"]) else 200
+        return web.json_response(result, status=status)
+
+    async def degrees(
+        self: "PathService", request: web.Request
+    ) -> web.Response:
+        """GET /degrees?start=<name>&end=<name>: the degrees of separation
+        between two artists, None if an artist is unknown or there is no
+        path
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+
+        Returns:
+            web.Response: The JSON response
+        """
+        start, end = self._pair(request)
+        degrees = await self._degrees.submit((start, end))
+        return web.json_response(
+            {"start": start, "end": end, "degrees": degrees}
+        )
+
+    async def artists(
+        self: "PathService", request: web.Request
+    ) -> web.Response:
+        """GET /artists?q=<name>&limit=<n>: the artist a name resolves to
+        and the artists it autocompletes to
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+
+        Raises:
+            web.HTTPBadRequest: If the name is missing or the limit is not
+            a positive integer
+
+        Returns:
+            web.Response: The JSON response
+        """
+        name = request.query.get("q", "").strip()
+        if not name:
+            raise web.HTTPBadRequest(text="q is required")
+        try:
+            limit = int(request.query.get("limit", COMPLETION_LIMIT))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise web.HTTPBadRequest(text="limit must be a positive integer")
+        loop = asyncio.get_running_loop()
+        return web.json_response(
+            await loop.run_in_executor(None, self._match_artists, name, limit)
+        )
+
+    async def health(
+        self: "PathService", request: web.Request
+    ) -> web.Response:
+        """GET /health: liveness, with the number of requests in flight
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+
+        Returns:
+            web.Response: The JSON response
+        """
+        return web.json_response(
+            {"status": "ok", "in_flight": self._in_flight}
+        )
+
+    async def export_metrics(
+        self: "PathService", request: web.Request
+    ) -> web.Response:
+        """GET /metrics: the process metrics in the Prometheus text format
+
+        Args:
+            self (PathService): Instance of PathService
+            request (web.Request): The request
+
+        Returns:
+            web.Response: The text response
+        """
+        return web.Response(text=metrics.to_prometheus())
+
+
+def serve(
+    six_degrees: SixDegrees,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    **options: Any,
+) -> None:
+    """Runs the path service until interrupted
+
+    Args:
+        six_degrees (SixDegrees): Instance of SixDegrees
+        host (str, optional): The interface to listen on. Defaults to
+        "127.0.0.1".
+        port (int, optional): The port to listen on. Defaults to 8080.
+        options (Any): Keyword arguments for PathService
+    """
+    app = PathService(six_degrees, **options).create_app()
+    # per-request access logs would dominate at thousands of requests per
+    # second, so latencies are only recorded in the metrics
+    web.run_app(app, host=host, port=port, access_log=None)
@@ -1,13 +1,35 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from spotify_client import SpotifyClient
+from path_engine import PathEngine
+from graph_snapshot import export_snapshot, load_snapshot
+from artist_index import ArtistIndex
+from hub_labels import HubLabels
+from bulk_export import export_bulk_csvs
+from separation import separation_report
+from analytics import analytics_report, BETWEENNESS_SAMPLE
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from track_filter import TrackFilter
+from checkpoint import Checkpoint
+from metrics import metrics
+from path_cache import PathCache
+from sync_state import SyncState, release_day
 from neo4j_client import Neo4jClient, clear_db_artists, clear_db_tracks
 from file_utilities import (
     read_genres,
     read_artist_csv,
     read_track_csv,
+    iter_track_batches,
     write_csv_header,
     write_csv,
     clear_file,
+    truncate_partial_line,
 )
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 import logging
 
 logger = logging.getLogger()
@@ -18,6 +40,16 @@ ARTIST_HEADERS = [
 ALBUM_HEADERS = [
     "id",
 ]
+PROGRESS_INTERVAL = 10000
+ARTIST_PROGRESS_INTERVAL = 100
+WRITE_CHUNK_SIZE = 1000
+SNAPSHOT_PATH = "data/graph.snap"
+LABELS_PATH = "data/hub_labels.idx"
+# maximum number of ids accepted by the Get Several Albums endpoint
+ALBUM_BATCH_SIZE = 20
+SEARCH_LIMIT = 50
+# the Search endpoint rejects offset + limit beyond 1000
+MAX_SEARCH_RESULTS = 1000
 TRACK_HEADERS = [
     "name",
     "id",
@@ -25,48 +57,239 @@ TRACK_HEADERS = [
 ]
 
 
+def _is_newer(path: str, *others: str) -> bool:
+    """Checks whether a file exists and is newer than other files
+
+    Args:
+        path (str): The path to the file
+        others (str): The paths to compare against
+
+    Returns:
+        bool: Whether path is newer than every existing file in others
+    """
+    if not os.path.isfile(path):
+        return False
+    mtime = os.path.getmtime(path)
+    return all(
+        mtime >= os.path.getmtime(other)
+        for other in others
+        if os.path.isfile(other)
+    )
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    """Splits a stream into lists of at most size items
+
+    Args:
+        items (Iterable): The stream
+        size (int): The maximum chunk size
+
+    Yields:
+        Iterator[list]: The chunks
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _ordered_map(func: Callable, items: list, workers: int) -> Iterator:
+    """Maps a function over items on a thread pool, yielding results in
+    order while keeping at most two results per worker in flight
+
+    Args:
+        func (Callable): The function to map
+        items (list): The items
+        workers (int): The number of threads
+
+    Yields:
+        Iterator: The results, in the order of the items
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 class SixDegrees:
     """Class to handle functionality between Neo4j and Spotify APIs"""
 
-    def __init__(self: "SixDegrees") -> None:
-        self._spotify = SpotifyClient()
-        self._genres = read_genres("data/genres.json")
+    def __init__(
+        self: "SixDegrees",
+        cache: ResponseCache | None = None,
+        limiter: RateLimiter | None = None,
+        spotify: SpotifyClient | None = None,
+        path_cache: PathCache | None = None,
+        genres_path: str = "data/genres.json",
+    ) -> None:
+        if spotify is None:
+            spotify = SpotifyClient(cache=cache, limiter=limiter)
+        self._spotify = spotify
+        self._path_cache = path_cache
+        self._genres = read_genres(genres_path)
         self._artists = []
-        self._albums = []
         self._tracks = []
+        self._engine = None
+        self._labels = None
+        self._artist_index = None
+        # shared graph version the engine and indexes were loaded at
+        self._graph_version = None
+        # reentrant, as loading the labels loads the engine
+        self._graph_lock = threading.RLock()
+        self._checkpoint = Checkpoint("data/checkpoint.jsonl")
+        self._sync = SyncState("data/sync_state.json")
 
     def verify_conn(self: "SixDegrees") -> None:
-        """Verifies connection to Neo4j database
+        """Verifies connection to Neo4j database and creates the id
+        constraints if they are missing, e.g. after a bulk import
 
         Args:
             self (SixDegrees): Instance of SixDegrees
         """
         with Neo4jClient() as neo4j_client:
             neo4j_client.verify_conn()
+            neo4j_client.create_constraints()
 
-    def scrape_artists(self: "SixDegrees") -> None:
-        """Scrapes the top 50 artists for each genre
+    def graph_changed(self: "SixDegrees") -> None:
+        """Drops the in-process engine and indexes, and invalidates the
+        shared path cache, after the artist or track data changed
 
         Args:
             self (SixDegrees): Instance of SixDegrees
         """
-        limit = 50
-        for i, genre in enumerate(self._genres):
-            offset = 0
+        with self._graph_lock:
+            self._drop_graph()
+            if self._path_cache is not None:
+                self._path_cache.bump_version()
+
+    def _drop_graph(self: "SixDegrees") -> None:
+        """Drops the in-process engine and indexes, to be reloaded on their
+        next use. Callers hold the graph lock
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+        """
+        self._engine = None
+        self._labels = None
+        self._artist_index = None
+        self._graph_version = None
+
+    def _loading_graph(self: "SixDegrees") -> None:
+        """Records the shared graph version before the first of the engine
+        and indexes is loaded. It is read before the files, so a change
+        landing in between only causes an extra reload. Callers hold the
+        graph lock
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+        """
+        if self._graph_version is None and self._path_cache is not None:
+            self._graph_version = self._path_cache.version()
+
+    def sync_graph(self: "SixDegrees", version: int | None = None) -> None:
+        """Drops the in-process engine and indexes if another process,
+        e.g. an import or refresh, changed the graph since they were loaded,
+        so long-running instances do not keep answering from the old graph
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            version (int | None, optional): The graph version, if it was
+            just read from the path cache. Defaults to None, which reads it.
+        """
+        if self._path_cache is None or self._graph_version is None:
+            return
+        if version is None:
+            version = self._path_cache.version()
+        with self._graph_lock:
+            if version is not None and version != self._graph_version:
+                logger.info(
+                    "Graph version changed from %s to %s, reloading",
+                    self._graph_version,
+                    version,
+                )
+                self._drop_graph()
+
+    @metrics.timed("stage_seconds", stage="scrape_artists")
+    def scrape_artists(
+        self: "SixDegrees", workers: int = 1, pages: int = 1
+    ) -> None:
+        """Scrapes the top artists for each genre, several genres at once
+        if asked. Artists are deduplicated as each genre arrives, keeping
+        the genre order
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of genres scraped at once.
+            Defaults to 1.
+            pages (int, optional): The number of pages of 50 artists per
+            genre, at most 20. Defaults to 1.
+        """
+        seen = set()
+
+        def add(artists: list) -> None:
+            for artist in artists:
+                if artist["id"] not in seen:
+                    seen.add(artist["id"])
+                    self._artists.append(artist)
+
+        pending = []
+        for genre in self._genres:
+            if genre in self._checkpoint.genres:
+                add(self._checkpoint.genres[genre])
+            else:
+                pending.append(genre)
+        results = _ordered_map(
+            lambda genre: self.scrape_genre(genre, pages), pending, workers
+        )
+        for i, (genre, genre_artists) in enumerate(zip(pending, results)):
             logger.info(
-                "Scraping artists for genre %s/%s", i + 1, len(self._genres)
+                "Scraped %s artists for genre %s (%s/%s)",
+                len(genre_artists),
+                genre,
+                i + 1,
+                len(pending),
             )
-            for _ in range(1):
-                query = f"genre:{str(genre)}"
-                results = self._spotify.search(
-                    q=query, cat="artist", limit=limit, offset=offset
-                )
-                self._artists += results["artists"]["items"]
-                if results["artists"]["next"]:
-                    offset += limit
-                else:
-                    break
+            self._checkpoint.record_genre(genre, genre_artists)
+            add(genre_artists)
+        metrics.increment("artists_discovered_total", len(self._artists))
+
+    def scrape_genre(self: "SixDegrees", genre: str, pages: int = 1) -> list:
+        """Scrapes the top artists of a genre, paging through the search
+        results
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            genre (str): The genre
+            pages (int, optional): The maximum number of pages of 50
+            artists. Defaults to 1.
+
+        Returns:
+            list: The artists, most relevant first
+        """
+        limit = SEARCH_LIMIT
+        end = min(pages * limit, MAX_SEARCH_RESULTS)
+        genre_artists = []
+        offset = 0
+        while offset < end:
+            results = self._spotify.search(
+                q=f"genre:{genre}",
+                cat="artist",
+                limit=min(limit, end - offset),
+                offset=offset,
+            )
+            genre_artists += results["artists"]["items"]
+            if not results["artists"]["next"]:
+                break
+            offset += limit
+        return genre_artists
 
+    @metrics.timed("stage_seconds", stage="filter_artists")
     def filter_artists(self: "SixDegrees") -> None:
         """Filters artists based on popularity and uniqueness
 
@@ -75,16 +298,16 @@ class SixDegrees:
         """
         write_csv_header("data/artists.csv", ARTIST_HEADERS)
         final_artists = []
+        seen = set()
         for artist in self._artists:
             artist_id = artist["id"]
-            if (
-                artist_id not in [a["id"] for a in final_artists]
-                and artist["popularity"] >= 40
-            ):
+            if artist_id not in seen and artist["popularity"] >= 40:
+                seen.add(artist_id)
                 final_artists.append({"name": artist["name"], "id": artist_id})
         self._artists = final_artists
         write_csv("data/artists.csv", self._artists, ARTIST_HEADERS)
 
+    @metrics.timed("stage_seconds", stage="create_artists")
     def create_artists(self: "SixDegrees") -> None:
         """Creates artist nodes in Neo4j database
 
@@ -93,20 +316,36 @@ class SixDegrees:
         """
         clear_db_artists()
         with Neo4jClient() as neo4j_client:
-            for artist in self._artists:
-                neo4j_client.create_artist_node(artist)
+            neo4j_client.create_artist_nodes(self._artists)
 
-    def initialize_artists(self: "SixDegrees") -> None:
+    def initialize_artists(
+        self: "SixDegrees",
+        resume: bool = False,
+        workers: int = 1,
+        pages: int = 1,
+    ) -> None:
         """Initializes the artists data using Spotify API
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            resume (bool, optional): Whether to continue from the last
+            checkpoint. Defaults to False.
+            workers (int, optional): The number of genres scraped at once.
+            Defaults to 1.
+            pages (int, optional): The number of pages of 50 artists per
+            genre. Defaults to 1.
         """
+        if resume and "artists" in self._checkpoint.stages:
+            logger.info("Artists already initialized, skipping")
+            return
         clear_file("data/artists.csv")
-        self.scrape_artists()
+        self._artists = []
+        self.scrape_artists(workers, pages)
         self.filter_artists()
         self.create_artists()
+        self._checkpoint.record_stage("artists")
 
+    @metrics.timed("stage_seconds", stage="import_artists")
     def import_artists(self: "SixDegrees") -> None:
         """Imports artists from the id file
 
@@ -115,6 +354,7 @@ class SixDegrees:
         """
         self._artists = read_artist_csv("data/artists.csv")
         self.create_artists()
+        self.graph_changed()
 
     def scrape_albums(self: "SixDegrees", artist_id: str) -> list:
         """Scrapes albums and singles for a given artist
@@ -130,7 +370,7 @@ class SixDegrees:
         offset = 0
         limit = 50
         while True:
-            logger.info("Scraping albums")
+            logger.debug("Scraping albums for %s at %s", artist_id, offset)
             albums = self._spotify.artist_albums(
                 artist_id=artist_id,
                 album_type="album,single",
@@ -144,64 +384,198 @@ class SixDegrees:
                 break
         return discography
 
-    def scrape_tracks(self: "SixDegrees") -> None:
-        """Scrapes tracks for a given list of albums
+    def scrape_discographies(
+        self: "SixDegrees", workers: int = 1
+    ) -> Iterator[dict]:
+        """Scrapes the albums of every artist, optionally concurrently. The
+        albums keep the order of the artists either way
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of artists scraped at
+            once. Defaults to 1.
+
+        Yields:
+            Iterator[dict]: The albums, one at a time
+        """
+        artist_ids = [artist["id"] for artist in self._artists]
+        discographies = _ordered_map(self.discography, artist_ids, workers)
+        for i, albums in enumerate(discographies):
+            artist_id = artist_ids[i]
+            if (i + 1) % ARTIST_PROGRESS_INTERVAL == 0:
+                logger.info(
+                    "Scraped albums for artist %s/%s", i + 1, len(artist_ids)
+                )
+            metrics.increment("albums_scraped_total", len(albums))
+            if artist_id not in self._checkpoint.discographies:
+                self._checkpoint.record_discography(artist_id, albums)
+            self._sync.update(artist_id, albums)
+            yield from albums
+
+    def discography(self: "SixDegrees", artist_id: str) -> list:
+        """Gets the albums of an artist from the checkpoint, scraping them
+        if they have not been scraped yet
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            artist_id (str): Spotify artist id
+
+        Returns:
+            list: List of albums and singles
+        """
+        albums = self._checkpoint.discographies.get(artist_id)
+        if albums is not None:
+            return [dict(album) for album in albums]
+        return self.scrape_albums(artist_id)
+
+    def scrape_tracks(
+        self: "SixDegrees", albums: Iterable[dict]
+    ) -> Iterator[dict]:
+        """Scrapes tracks for a stream of albums, skipping albums already
+        seen, as the same collaboration album is listed under each of its
+        artists, and albums completed before the last checkpoint. Albums are
+        fetched in full batches and the track listings that do not fit in
+        the album object are paged
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            albums (Iterable[dict]): The albums, e.g. from
+            scrape_discographies
+
+        Yields:
+            Iterator[dict]: The tracks, one at a time
         """
-        tracks = []
-        for i in range(0, len(self._albums), 20):
-            logger.info("Scraping tracks %s/%s", i, len(self._albums))
-            album_ids = [album["id"] for album in self._albums[i : i + 20]]
-            tracks += [
-                album["tracks"]["items"]
-                for album in self._spotify.albums(albums=album_ids)["albums"]
-            ]
-        tracks = [track for album in tracks for track in album]
-        self._tracks += tracks
+        seen = set(self._checkpoint.albums)
+        batch = []
+        for album in albums:
+            if album["id"] in seen:
+                continue
+            seen.add(album["id"])
+            batch.append(album["id"])
+            if len(batch) == ALBUM_BATCH_SIZE:
+                yield from self.scrape_album_batch(batch)
+                self._checkpoint.mark_albums(batch)
+                batch = []
+        if batch:
+            yield from self.scrape_album_batch(batch)
+            self._checkpoint.mark_albums(batch)
+        logger.info("Scraped tracks for %s albums", len(seen))
 
-    def filter_tracks(self: "SixDegrees") -> None:
+    def scrape_album_batch(
+        self: "SixDegrees", album_ids: list[str]
+    ) -> Iterator[dict]:
+        """Scrapes the tracks of a batch of albums
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            album_ids (list[str]): At most ALBUM_BATCH_SIZE album ids
+
+        Yields:
+            Iterator[dict]: The tracks, one at a time
+        """
+        for album in self._spotify.albums(albums=album_ids)["albums"]:
+            if album is None:
+                continue
+            metrics.increment("albums_fetched_total")
+            yield from self.album_tracks(album)
+
+    def album_tracks(self: "SixDegrees", album: dict) -> Iterator[dict]:
+        """Yields every track of a full album object, paging past the
+        tracks embedded in it
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            album (dict): The full album object
+
+        Yields:
+            Iterator[dict]: The tracks, one at a time
+        """
+        page = album["tracks"]
+        offset = 0
+        limit = 50
+        while True:
+            yield from page["items"]
+            if not page["next"]:
+                break
+            offset += len(page["items"])
+            page = self._spotify.album_tracks(
+                album_id=album["id"], limit=limit, offset=offset
+            )
+
+    def filter_tracks(
+        self: "SixDegrees",
+        tracks: Iterable[dict],
+        track_filter: TrackFilter | None = None,
+    ) -> Iterator[dict]:
         """Filters tracks based on artist collaborations. Only one
         collaboration per artist pair is allowed
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            tracks (Iterable[dict]): The scraped tracks
+            track_filter (TrackFilter | None, optional): The filter to
+            apply, e.g. one seeded with existing tracks. Defaults to None,
+            which creates one for the current artists.
+
+        Yields:
+            Iterator[dict]: The kept track records, one at a time
         """
-        write_csv_header("data/tracks.csv", TRACK_HEADERS)
-        collabs = set()
-        filtered_tracks = []
-        for i, track in enumerate(self._tracks):
-            logger.info("Filtering tracks %s/%s", i + 1, len(self._tracks))
-            track_id = track["id"]
-            included_artists = [
-                {"name": artist["name"], "id": artist["id"]}
-                for artist in track["artists"]
-                if any(a.get("id") == artist["id"] for a in self._artists)
-            ]
-            if len(included_artists) == 0 or len(included_artists) == 1:
-                continue
-            track_conns = set()
-            for i, artist_i in enumerate(included_artists):
-                for artist_j in included_artists[i + 1 :]:
-                    conn = tuple(sorted([artist_i["id"], artist_j["id"]]))
-                    track_conns.add(conn)
-            if len(track_conns.intersection(collabs)) == 0 and all(
-                track_id != t["id"] for t in filtered_tracks
-            ):
-                collabs.update(track_conns)
-                filtered_tracks.append(
-                    {
-                        "name": track["name"],
-                        "id": track_id,
-                        "artists": [
-                            artist["id"] for artist in included_artists
-                        ],
-                    }
+        if track_filter is None:
+            track_filter = TrackFilter(
+                artist["id"] for artist in self._artists
+            )
+        i = 0
+        kept = len(track_filter)
+        for i, track in enumerate(tracks, start=1):
+            if i % PROGRESS_INTERVAL == 0:
+                logger.info(
+                    "Filtered %s tracks, kept %s", i, len(track_filter)
                 )
-        self._tracks = filtered_tracks
-        write_csv("data/tracks.csv", self._tracks, TRACK_HEADERS)
+            filtered = track_filter.accept(track)
+            if filtered is not None:
+                yield filtered
+        metrics.increment("tracks_scraped_total", i)
+        metrics.increment("tracks_kept_total", len(track_filter) - kept)
+        logger.info("Filtered %s tracks, kept %s", i, len(track_filter))
+
+    def write_tracks(
+        self: "SixDegrees",
+        tracks: Iterable[dict],
+        create_nodes: bool = False,
+        chunk_size: int = WRITE_CHUNK_SIZE,
+    ) -> int:
+        """Appends filtered tracks to the tracks file, and optionally to the
+        Neo4j database, in chunks so finished work survives a crash
 
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            tracks (Iterable[dict]): The filtered track records
+            create_nodes (bool, optional): Whether to also create the track
+            nodes and their relationships. Defaults to False.
+            chunk_size (int, optional): The number of tracks per write.
+            Defaults to WRITE_CHUNK_SIZE.
+
+        Returns:
+            int: The number of tracks written
+        """
+        written = 0
+        for chunk in _chunks(tracks, chunk_size):
+            # the database goes first: a resume seeds its filter from the
+            # tracks file, so a chunk only reaches it once it is in Neo4j,
+            # and rewriting a chunk after a failed csv write merges
+            if create_nodes:
+                with metrics.timer("write_seconds", target="neo4j"):
+                    with Neo4jClient() as neo4j_client:
+                        neo4j_client.create_track_nodes(chunk, link=True)
+            with metrics.timer("write_seconds", target="csv"):
+                write_csv("data/tracks.csv", chunk, TRACK_HEADERS)
+            self._checkpoint.commit()
+            written += len(chunk)
+            metrics.increment("tracks_written_total", len(chunk))
+        self._checkpoint.commit()
+        return written
+
+    @metrics.timed("stage_seconds", stage="create_tracks")
     def create_tracks(self: "SixDegrees") -> None:
         """Creates track nodes in Neo4j database
 
@@ -210,87 +584,684 @@ class SixDegrees:
         """
         clear_db_tracks()
         with Neo4jClient() as neo4j_client:
-            for track in self._tracks:
-                neo4j_client.create_track_node(track)
+            neo4j_client.create_track_nodes(self._tracks)
 
-    def initialize_tracks(self: "SixDegrees") -> None:
-        """Initializes the tracks data using Spotify API
+    @metrics.timed("stage_seconds", stage="initialize_tracks")
+    def initialize_tracks(
+        self: "SixDegrees",
+        workers: int = 1,
+        create_nodes: bool = False,
+        resume: bool = False,
+    ) -> None:
+        """Initializes the tracks data using Spotify API. Albums, tracks and
+        filtered tracks are streamed from one stage to the next, so memory
+        stays bounded by the filter's indexes
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of artists scraped at
+            once. Defaults to 1.
+            create_nodes (bool, optional): Whether to also create the track
+            nodes and their relationships as tracks are written. Defaults
+            to False.
+            resume (bool, optional): Whether to continue from the last
+            checkpoint, keeping the tracks already written. Defaults to
+            False.
         """
-        clear_file("data/tracks.csv")
+        if resume and "tracks" in self._checkpoint.stages:
+            logger.info("Tracks already initialized, skipping")
+            return
         self._artists = read_artist_csv("data/artists.csv")
-        for i, artist in enumerate(self._artists):
+        track_filter = TrackFilter(artist["id"] for artist in self._artists)
+        # the tracks file may be a previous run's if this one was
+        # interrupted before reaching the track stage
+        resume = resume and self._checkpoint.tracks_started
+        if resume and os.path.isfile("data/tracks.csv"):
+            truncate_partial_line("data/tracks.csv")
+            track_filter.seed(read_track_csv("data/tracks.csv"))
+            logger.info("Resuming with %s tracks", len(track_filter))
+        else:
+            self._checkpoint.reset_tracks()
+            clear_file("data/tracks.csv")
+            write_csv_header("data/tracks.csv", TRACK_HEADERS)
+            if create_nodes:
+                clear_db_tracks()
+        albums = self.scrape_discographies(workers)
+        tracks = self.filter_tracks(self.scrape_tracks(albums), track_filter)
+        self.write_tracks(tracks, create_nodes)
+        self._sync.save()
+        self._checkpoint.record_stage("tracks")
+        self.graph_changed()
+        self.update_labels()
+        self.log_cache_stats()
+
+    def scrape_new_albums(self: "SixDegrees", artist_id: str) -> list:
+        """Scrapes the albums and singles an artist released since their
+        high-water mark. Each album type is listed newest first, so paging
+        stops at the first album older than the mark
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            artist_id (str): Spotify artist id
+
+        Returns:
+            list: List of new albums and singles
+        """
+        since = self._sync.since(artist_id)
+        if since is None:
+            return self.scrape_albums(artist_id)
+        discography = []
+        limit = 50
+        for album_type in ("album", "single"):
+            offset = 0
+            while True:
+                albums = self._spotify.artist_albums(
+                    artist_id=artist_id,
+                    album_type=album_type,
+                    limit=limit,
+                    offset=offset,
+                )
+                new_albums = [
+                    album
+                    for album in albums["items"]
+                    if release_day(album) >= since
+                ]
+                discography += new_albums
+                if len(new_albums) < len(albums["items"]):
+                    break
+                if albums["next"]:
+                    offset += limit
+                else:
+                    break
+        return discography
+
+    def scrape_new_discographies(
+        self: "SixDegrees", workers: int = 1
+    ) -> Iterator[dict]:
+        """Scrapes the albums every artist released since the last sync,
+        raising their high-water marks as it goes
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of artists scraped at
+            once. Defaults to 1.
+
+        Yields:
+            Iterator[dict]: The new albums, one at a time
+        """
+        artist_ids = [artist["id"] for artist in self._artists]
+        discographies = _ordered_map(
+            self.scrape_new_albums, artist_ids, workers
+        )
+        for artist_id, albums in zip(artist_ids, discographies):
+            self._sync.update(artist_id, albums)
+            yield from albums
+
+    @metrics.timed("stage_seconds", stage="refresh_tracks")
+    def refresh_tracks(
+        self: "SixDegrees", workers: int = 1, create_nodes: bool = True
+    ) -> int:
+        """Adds the collaborations released since the last sync to the
+        tracks file and the Neo4j database, without deleting anything. New
+        tracks are filtered against the existing ones and only their
+        APPEARS_ON relationships are created
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of artists scraped at
+            once. Defaults to 1.
+            create_nodes (bool, optional): Whether to also add the new
+            tracks to the Neo4j database. Defaults to True.
+
+        Returns:
+            int: The number of tracks added
+        """
+        self._artists = read_artist_csv("data/artists.csv")
+        track_filter = TrackFilter(artist["id"] for artist in self._artists)
+        truncate_partial_line("data/tracks.csv")
+        track_filter.seed(read_track_csv("data/tracks.csv"))
+        albums = self.scrape_new_discographies(workers)
+        tracks = self.filter_tracks(self.scrape_tracks(albums), track_filter)
+        added = self.write_tracks(tracks, create_nodes)
+        self._sync.save()
+        self.graph_changed()
+        self.update_labels()
+        logger.info("Refresh added %s tracks", added)
+        self.log_cache_stats()
+        return added
+
+    def log_cache_stats(self: "SixDegrees") -> None:
+        """Logs the Spotify response cache counters, if caching is enabled
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+        """
+        stats = self._spotify.cache_stats()
+        if stats is not None:
             logger.info(
-                "Scraping albums for artist %s/%s", i + 1, len(self._artists)
+                "Spotify cache: %s hits, %s misses (%.1f%% hit rate)",
+                stats["hits"],
+                stats["misses"],
+                stats["hit_rate"] * 100,
             )
-            albums = self.scrape_albums(artist["id"])
-            self._albums += albums
-        self.scrape_tracks()
-        self.filter_tracks()
-        # self.create_tracks()
 
-    def import_tracks(self: "SixDegrees") -> None:
-        """Imports tracks from the id file
+    @metrics.timed("stage_seconds", stage="import_tracks")
+    def import_tracks(self: "SixDegrees", workers: int = 1) -> None:
+        """Imports tracks from the id file. The file is parsed in chunks
+        across processes, and each chunk is written to Neo4j as it arrives,
+        so the whole file is never held in memory
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of processes parsing the
+            file. Defaults to 1.
         """
-        self._tracks = read_track_csv("data/tracks.csv")
-        self.create_tracks()
+        clear_db_tracks()
+        with Neo4jClient() as neo4j_client:
+            neo4j_client.create_track_records(
+                iter_track_batches("data/tracks.csv", workers)
+            )
+        self.graph_changed()
 
-    def create_relationships(self: "SixDegrees") -> None:
+    @metrics.timed("stage_seconds", stage="create_relationships")
+    def create_relationships(
+        self: "SixDegrees", tracks: list | None = None
+    ) -> None:
         """Creates relationships between artists and tracks in Neo4j database
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            tracks (list | None, optional): Only link these tracks. Defaults
+            to None, which links every track in the database.
         """
         with Neo4jClient() as neo4j_manager:
-            neo4j_manager.create_relationships()
+            neo4j_manager.create_relationships(tracks)
+        self.graph_changed()
 
-    def initialize_data(self: "SixDegrees") -> None:
+    def initialize_data(
+        self: "SixDegrees",
+        workers: int = 1,
+        resume: bool = False,
+        pages: int = 1,
+    ) -> None:
         """Initializes the artists, tracks, and relationships in the Neo4j
         database with Spotify API
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of genres and artists
+            scraped at once. Defaults to 1.
+            resume (bool, optional): Whether to continue from the last
+            checkpoint instead of starting over. Defaults to False.
+            pages (int, optional): The number of pages of 50 artists per
+            genre. Defaults to 1.
         """
-        self.initialize_artists()
-        self.initialize_tracks()
-        self.create_relationships()
+        if not resume:
+            self._checkpoint.clear()
+        self.initialize_artists(resume, workers, pages)
+        self.initialize_tracks(workers, create_nodes=True, resume=resume)
 
-    def import_data(self: "SixDegrees") -> None:
+    def import_data(self: "SixDegrees", workers: int = 1) -> None:
         """Imports the artists, tracks, and relationships in the Neo4j
         database with given files
 
         Args:
             self (SixDegrees): Instance of SixDegrees
+            workers (int, optional): The number of processes parsing the
+            track file. Defaults to 1.
         """
         self.import_artists()
-        self.import_tracks()
+        self.import_tracks(workers)
         self.create_relationships()
 
-    def find_path(self: "SixDegrees", start: str, end: str) -> list:
-        """Finds the shortest path between two artists
+    @metrics.timed("stage_seconds", stage="load_engine")
+    def load_engine(self: "SixDegrees") -> PathEngine:
+        """Loads the in-process path engine once, memory-mapping the graph
+        snapshot if it is newer than the csv files and parsing the csv files
+        otherwise
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+
+        Returns:
+            PathEngine: The path engine
+        """
+        with self._graph_lock:
+            if self._engine is None:
+                self._loading_graph()
+                if _is_newer(
+                    SNAPSHOT_PATH, "data/artists.csv", "data/tracks.csv"
+                ):
+                    self._engine = load_snapshot(SNAPSHOT_PATH)
+                else:
+                    self._engine = PathEngine.from_csv(
+                        "data/artists.csv", "data/tracks.csv"
+                    )
+            return self._engine
+
+    @metrics.timed("stage_seconds", stage="export_snapshot")
+    def export_snapshot(self: "SixDegrees") -> None:
+        """Exports the artist and track csv files as a binary graph snapshot
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+        """
+        engine = PathEngine.from_csv("data/artists.csv", "data/tracks.csv")
+        export_snapshot(engine, SNAPSHOT_PATH)
+        logger.info(
+            "Exported %s artists and %s tracks to %s",
+            len(engine.artist_ids),
+            len(engine.track_ids),
+            SNAPSHOT_PATH,
+        )
+
+    @metrics.timed("stage_seconds", stage="export_bulk_import")
+    def export_bulk_import(
+        self: "SixDegrees", output_dir: str = "data/import"
+    ) -> dict:
+        """Exports the artist and track csv files as node and relationship
+        files for neo4j-admin database import
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            output_dir (str, optional): The directory for the importer
+            files. Defaults to "data/import".
+
+        Returns:
+            dict: The exported paths and counts, as returned by
+            bulk_export.export_bulk_csvs
+        """
+        return export_bulk_csvs(
+            "data/artists.csv", "data/tracks.csv", output_dir
+        )
+
+    @metrics.timed("stage_seconds", stage="build_labels")
+    def build_labels(self: "SixDegrees", max_hubs: int | None = None) -> None:
+        """Builds the hub label index answering degrees of separation
+        queries and saves it next to the csv files
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            max_hubs (int | None, optional): Only label from this many of
+            the best connected artists, for a faster build whose answers are
+            confirmed by a shorter BFS. Defaults to None, for every artist.
+        """
+        with self._graph_lock:
+            labels = HubLabels.build(self.load_engine(), max_hubs)
+            labels.save(LABELS_PATH)
+            self._labels = labels
+        logger.info(
+            "Built hub labels from %s hubs, %.1f entries per artist",
+            len(labels.order),
+            len(labels.hubs) / max(len(labels.offsets) - 1, 1),
+        )
+
+    @metrics.timed("stage_seconds", stage="update_labels")
+    def update_labels(self: "SixDegrees") -> None:
+        """Brings the hub label index up to date with the csv files, if it
+        was built. Tracks appended since it was built are folded in
+        incrementally, and anything else rebuilds it from as many hubs
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+        """
+        with self._graph_lock:
+            if not os.path.isfile(LABELS_PATH):
+                return
+            labels = HubLabels.load(LABELS_PATH)
+            if labels.update(self.load_engine()):
+                logger.info(
+                    "Updated hub labels to %s tracks", labels.track_count
+                )
+                labels.save(LABELS_PATH)
+                self._labels = labels
+            else:
+                logger.info("Artists or tracks changed, rebuilding hub labels")
+                self.build_labels(
+                    None if labels.complete else len(labels.order)
+                )
+
+    def load_labels(self: "SixDegrees") -> HubLabels | None:
+        """Loads the hub label index once, updating it first if the csv
+        files changed since it was saved
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+
+        Returns:
+            HubLabels | None: The index, or None if it was never built
+        """
+        with self._graph_lock:
+            if self._labels is None and os.path.isfile(LABELS_PATH):
+                self._loading_graph()
+                if not _is_newer(
+                    LABELS_PATH, "data/artists.csv", "data/tracks.csv"
+                ):
+                    self.update_labels()
+                if self._labels is None:
+                    self._labels = HubLabels.load(LABELS_PATH)
+            return self._labels
+
+    def load_artist_index(self: "SixDegrees") -> ArtistIndex:
+        """Loads the local artist name index from the artist file, once
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+
+        Returns:
+            ArtistIndex: The artist name index
+        """
+        with self._graph_lock:
+            if self._artist_index is None:
+                self._loading_graph()
+                self._artist_index = ArtistIndex.from_csv("data/artists.csv")
+            return self._artist_index
+
+    def resolve_artist(
+        self: "SixDegrees", name: str, allow_search: bool = False
+    ) -> str | None:
+        """Resolves an artist name to its id with the local artist index,
+        without using the Spotify API unless allowed. Names found by a
+        search are kept in the shared path cache, if there is one
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            name (str): The artist name
+            allow_search (bool, optional): Whether to fall back to a Spotify
+            search for names not in the graph. Defaults to False.
+
+        Returns:
+            str | None: The artist id, or None if the name is unknown
+        """
+        artist = self.load_artist_index().resolve(name)
+        if artist is not None:
+            return artist["id"]
+        if allow_search:
+            version = None
+            if self._path_cache is not None:
+                artist_id, version = self._path_cache.get_artist(name)
+                if artist_id is not None:
+                    return artist_id
+            items = self._spotify.search(
+                q=name, cat="artist", limit=1, offset=0
+            )["artists"]["items"]
+            if items:
+                if self._path_cache is not None:
+                    self._path_cache.set_artist(name, items[0]["id"], version)
+                return items[0]["id"]
+        return None
+
+    def complete_artist(
+        self: "SixDegrees", prefix: str, limit: int = 10
+    ) -> list:
+        """Autocompletes a partial artist name from the local artist index
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            prefix (str): The partial name
+            limit (int, optional): The maximum number of artists. Defaults
+            to 10.
+
+        Returns:
+            list: The matching artists
+        """
+        return self.load_artist_index().complete(prefix, limit)
+
+    def find_path(
+        self: "SixDegrees",
+        start: str,
+        end: str,
+        use_engine: bool = False,
+        allow_search: bool = False,
+    ) -> list:
+        """Finds the shortest path between two artists, through the shared
+        path cache if there is one
 
         Args:
             self (SpotifyClient): Instance of SpotifyClient
             start (str): Starting artist name
             end (str): Ending artist name
+            use_engine (bool, optional): Whether to answer from the
+            in-process path engine instead of Neo4j. Defaults to False.
+            allow_search (bool, optional): Whether to resolve names missing
+            from the local artist index with a Spotify search. Defaults to
+            False.
 
         Returns:
             list: The shortest path between two artists
         """
-        starting_id = self._spotify.search(
-            q=start, cat="artist", limit=1, offset=0
-        )["artists"]["items"][0]["id"]
-        ending_id = self._spotify.search(
-            q=end, cat="artist", limit=1, offset=0
-        )["artists"]["items"][0]["id"]
-        with Neo4jClient() as neo4j_manager:
-            return neo4j_manager.shortest_path(starting_id, ending_id)
+        starting_id = self.resolve_artist(start, allow_search)
+        ending_id = self.resolve_artist(end, allow_search)
+        if starting_id is None or ending_id is None:
+            logger.warning(
+                "Unknown artist: %s", end if starting_id else start
+            )
+            return []
+        version = None
+        if self._path_cache is not None:
+            path, version = self._path_cache.get_path(starting_id, ending_id)
+            if path is not None:
+                metrics.increment("path_cache_hits_total")
+                return path
+            metrics.increment("path_cache_misses_total")
+            self.sync_graph(version)
+        if use_engine:
+            path = self.load_engine().shortest_path(starting_id, ending_id)
+        else:
+            with Neo4jClient() as neo4j_manager:
+                path = neo4j_manager.shortest_path(starting_id, ending_id)
+        if self._path_cache is not None:
+            self._path_cache.set_path(starting_id, ending_id, path, version)
+        return path
+
+    def find_paths(
+        self: "SixDegrees", pairs: list, use_engine: bool = False
+    ) -> list[dict]:
+        """Finds the shortest paths between many pairs of artists in one
+        batch, resolving the names with the local artist index
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            pairs (list): (start name, end name) tuples
+            use_engine (bool, optional): Whether to answer from the
+            in-process path engine instead of Neo4j. Defaults to False.
+
+        Returns:
+            list[dict]: For each pair in order, its start and end ids, the
+            path and its degrees of separation, as returned by
+            Neo4jClient.shortest_paths. Unknown names have None ids.
+        """
+        id_pairs = [
+            (self.resolve_artist(start), self.resolve_artist(end))
+            for start, end in pairs
+        ]
+        known = [pair for pair in id_pairs if None not in pair]
+        results = self._shortest_paths(known, use_engine)
+        found = iter(results)
+        return [
+            next(found)
+            if None not in pair
+            else {
+                "start": pair[0],
+                "end": pair[1],
+                "path": [],
+                "degrees": None,
+            }
+            for pair in id_pairs
+        ]
+
+    def _shortest_paths(
+        self: "SixDegrees", pairs: list, use_engine: bool
+    ) -> list[dict]:
+        """Finds the shortest paths between pairs of artist ids, serving
+        the pairs it can from the shared path cache and computing the rest
+        in one batch
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            pairs (list): (start_id, end_id) tuples
+            use_engine (bool): Whether to answer from the in-process path
+            engine instead of Neo4j
+
+        Returns:
+            list[dict]: The results, as returned by
+            Neo4jClient.shortest_paths
+        """
+        cached = [None] * len(pairs)
+        version = None
+        if self._path_cache is not None:
+            cached, version = self._path_cache.get_paths(pairs)
+            self.sync_graph(version)
+        missing = [pair for pair, path in zip(pairs, cached) if path is None]
+        if use_engine:
+            computed = self.load_engine().shortest_paths(missing)
+        else:
+            with Neo4jClient() as neo4j_manager:
+                computed = neo4j_manager.shortest_paths(missing)
+        if self._path_cache is not None:
+            hits = len(pairs) - len(missing)
+            metrics.increment("path_cache_hits_total", hits)
+            metrics.increment("path_cache_misses_total", len(missing))
+            self._path_cache.set_paths(
+                [(r["start"], r["end"], r["path"]) for r in computed], version
+            )
+        found = iter(computed)
+        results = []
+        for (start, end), path in zip(pairs, cached):
+            if path is None:
+                results.append(next(found))
+            else:
+                results.append(
+                    {
+                        "start": start,
+                        "end": end,
+                        "path": path,
+                        "degrees": (len(path) - 1) // 2 if path else None,
+                    }
+                )
+        return results
+
+    def degrees_of_separation(
+        self: "SixDegrees", start: str, end: str
+    ) -> int | None:
+        """Gets the degrees of separation between two artists from the hub
+        label index, or a BFS on the in-process path engine if it was never
+        built
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            start (str): Starting artist name
+            end (str): Ending artist name
+
+        Returns:
+            int | None: The degrees of separation, or None if an artist is
+            unknown or there is no path
+        """
+        starting_id = self.resolve_artist(start)
+        ending_id = self.resolve_artist(end)
+        if starting_id is None or ending_id is None:
+            logger.warning(
+                "Unknown artist: %s", end if starting_id else start
+            )
+            return None
+        engine = self.load_engine()
+        labels = self.load_labels()
+        if labels is not None:
+            return labels.degrees(engine, starting_id, ending_id)
+        path = engine.shortest_path(starting_id, ending_id)
+        return (len(path) - 1) // 2 if path else None
+
+    def find_ranked_paths(
+        self: "SixDegrees",
+        start: str,
+        end: str,
+        k: int = 1,
+        weight: str = "hops",
+    ) -> list[dict]:
+        """Finds the k cheapest paths between two artists under an edge
+        weight, from the in-process path engine, guided by the hub label
+        index for a single shortest path if it was fully built
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            start (str): Starting artist name
+            end (str): Ending artist name
+            k (int, optional): The number of paths. Defaults to 1.
+            weight (str, optional): A weight name from
+            path_engine.WEIGHTS. Defaults to "hops".
+
+        Returns:
+            list[dict]: The paths, cheapest first, as returned by
+            PathEngine.k_shortest_paths
+        """
+        starting_id = self.resolve_artist(start)
+        ending_id = self.resolve_artist(end)
+        if starting_id is None or ending_id is None:
+            logger.warning(
+                "Unknown artist: %s", end if starting_id else start
+            )
+            return []
+        engine = self.load_engine()
+        if k == 1:
+            heuristic = None
+            labels = self.load_labels() if weight == "hops" else None
+            # complete labels give exact remaining hops, so A* only
+            # expands artists on shortest paths
+            if labels is not None and labels.complete:
+                heuristic = labels.heuristic(engine, ending_id)
+            path = engine.weighted_path(
+                starting_id, ending_id, weight, heuristic
+            )
+            return [] if path is None else [path]
+        return engine.k_shortest_paths(starting_id, ending_id, k, weight)
+
+    @metrics.timed("stage_seconds", stage="separation_report")
+    def separation_report(
+        self: "SixDegrees", sample: int | None = None, workers: int = 1
+    ) -> dict:
+        """Computes the degrees of separation histogram and eccentricities
+        over the in-process path engine
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            sample (int | None, optional): The number of source artists to
+            sample. Defaults to None, which uses every artist.
+            workers (int, optional): The number of processes. Defaults to 1.
+
+        Returns:
+            dict: The report, as returned by separation.separation_report
+        """
+        engine = self.load_engine()
+        snapshot_path = None
+        if _is_newer(SNAPSHOT_PATH, "data/artists.csv", "data/tracks.csv"):
+            snapshot_path = SNAPSHOT_PATH
+        return separation_report(engine, sample, workers, snapshot_path)
+
+    @metrics.timed("stage_seconds", stage="analytics_report")
+    def analytics_report(
+        self: "SixDegrees",
+        sample: int | None = BETWEENNESS_SAMPLE,
+        top: int = 10,
+        workers: int = 1,
+    ) -> dict:
+        """Reports the components, degree distribution, sampled betweenness
+        and articulation points of the in-process path engine
+
+        Args:
+            self (SixDegrees): Instance of SixDegrees
+            sample (int | None, optional): The number of betweenness sources
+            to sample. Defaults to BETWEENNESS_SAMPLE, and None uses every
+            artist.
+            top (int, optional): The number of artists listed per ranking.
+            Defaults to 10.
+            workers (int, optional): The number of processes. Defaults to 1.
+
+        Returns:
+            dict: The report, as returned by analytics.analytics_report
+        """
+        return analytics_report(self.load_engine(), sample, top, workers)
 
+    @metrics.timed("stage_seconds", stage="clear_db")
     def clear_db(self: "SixDegrees") -> None:
         """Clears the Neo4j database
 
@@ -299,3 +1270,4 @@ class SixDegrees:
         """
         clear_db_artists()
         clear_db_tracks()
+        self.graph_changed()
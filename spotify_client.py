@@ -1,22 +1,181 @@
 import os
+import logging
 from dotenv import load_dotenv
-from typing import Any
+from typing import Any, Callable
+from requests import Session
+from requests.adapters import HTTPAdapter
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyClientCredentials
+from metrics import metrics
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from urllib3 import Retry
 import spotipy
 
 load_dotenv()
 
+logger = logging.getLogger()
+MAX_RETRIES = 5
+STATUS_FORCELIST = (500, 502, 503, 504)
+
+
+def rate_limited_session(retries: int = 3) -> Session:
+    """Builds a requests session that retries server errors like spotipy's
+    default one, but returns 429 responses instead of sleeping through
+    their Retry-After in urllib3, so the rate limiter sees them
+
+    Args:
+        retries (int, optional): The number of retries on server errors.
+        Defaults to 3.
+
+    Returns:
+        Session: The session, for spotipy.Spotify's requests_session
+    """
+    retry = Retry(
+        total=retries,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=STATUS_FORCELIST,
+        # urllib3 retries any response with a Retry-After header otherwise
+        respect_retry_after_header=False,
+    )
+    session = Session()
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class SpotifyClient:
     """Spotify class to handle spotify API requests"""
 
-    def __init__(self: "SpotifyClient") -> None:
-        client_id = os.getenv("SPOTIFY_CLIENT_ID")
-        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-        auth_manager = SpotifyClientCredentials(
-            client_id=client_id, client_secret=client_secret
-        )
-        self._spotify = spotipy.Spotify(auth_manager=auth_manager)
+    def __init__(
+        self: "SpotifyClient",
+        cache: ResponseCache | None = None,
+        limiter: RateLimiter | None = None,
+        max_retries: int = MAX_RETRIES,
+        backend: Any = None,
+    ) -> None:
+        if backend is not None:
+            # a spotipy.Spotify stand-in, e.g. the benchmark mock
+            self._spotify = backend
+        else:
+            client_id = os.getenv("SPOTIFY_CLIENT_ID")
+            client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+            auth_manager = SpotifyClientCredentials(
+                client_id=client_id, client_secret=client_secret
+            )
+            if limiter is None:
+                self._spotify = spotipy.Spotify(auth_manager=auth_manager)
+            else:
+                self._spotify = spotipy.Spotify(
+                    auth_manager=auth_manager,
+                    requests_session=rate_limited_session(),
+                )
+        self._cache = cache
+        self._limiter = limiter
+        self._max_retries = max_retries
+
+    def cache_stats(self: "SpotifyClient") -> dict | None:
+        """Gets the response cache hit and miss counters
+
+        Args:
+            self (SpotifyClient): Instance of SpotifyClient
+
+        Returns:
+            dict | None: The counters, or None if caching is disabled
+        """
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
+    def _request(
+        self: "SpotifyClient",
+        endpoint: str,
+        params: dict,
+        fetch: Callable[[], Any],
+    ) -> Any:
+        """Serves a request from the response cache, fetching and caching it
+        on a miss. Records the request count, cache hits and misses, the
+        latency of each fetched response and, when the cache stores it as
+        JSON, its size
+
+        Args:
+            self (SpotifyClient): Instance of SpotifyClient
+            endpoint (str): The endpoint name
+            params (dict): The request parameters
+            fetch (Callable[[], Any]): Performs the API request
+
+        Returns:
+            Any: The response
+        """
+        metrics.increment("spotify_requests_total", endpoint=endpoint)
+        if self._cache is not None:
+            response = self._cache.get(endpoint, params)
+            if response is not None:
+                metrics.increment(
+                    "spotify_cache_hits_total", endpoint=endpoint
+                )
+                return response
+            metrics.increment("spotify_cache_misses_total", endpoint=endpoint)
+        with metrics.timer("spotify_request_seconds", endpoint=endpoint):
+            response = self._fetch(endpoint, fetch)
+        if response is not None and self._cache is not None:
+            # sized from the cache's own serialization, as spotipy does not
+            # expose the raw body
+            size = self._cache.set(endpoint, params, response)
+            if size is not None:
+                metrics.increment(
+                    "spotify_response_bytes_total", size, endpoint=endpoint
+                )
+        return response
+
+    def _fetch(
+        self: "SpotifyClient", endpoint: str, fetch: Callable[[], Any]
+    ) -> Any:
+        """Performs an API request under the rate limiter, waiting out 429
+        responses for their Retry-After period
+
+        Args:
+            self (SpotifyClient): Instance of SpotifyClient
+            endpoint (str): The endpoint name, for the metrics
+            fetch (Callable[[], Any]): Performs the API request
+
+        Returns:
+            Any: The response
+        """
+        if self._limiter is None:
+            return fetch()
+        for attempt in range(self._max_retries + 1):
+            with metrics.timer("spotify_limiter_wait_seconds"):
+                self._limiter.acquire()
+            try:
+                response = fetch()
+            except SpotifyException as e:
+                metrics.increment(
+                    "spotify_errors_total",
+                    endpoint=endpoint,
+                    status=e.http_status,
+                )
+                if e.http_status != 429 or attempt == self._max_retries:
+                    raise
+                metrics.increment("spotify_retries_total", endpoint=endpoint)
+                headers = e.headers or {}
+                retry_after = float(headers.get("Retry-After", 2**attempt))
+                logger.warning(
+                    "Rate limited, retrying in %ss (attempt %s/%s)",
+                    retry_after,
+                    attempt + 1,
+                    self._max_retries,
+                )
+                self._limiter.penalize(retry_after)
+                continue
+            self._limiter.reward()
+            return response
+        return None
 
     def get_artist(self: "SpotifyClient", artist_id: str) -> Any:
         """Gets artist information from Spotify API
@@ -28,7 +187,11 @@ class SpotifyClient:
         Returns:
             dict: Artist information
         """
-        return self._spotify.artist(artist_id=artist_id)
+        return self._request(
+            "artist",
+            {"artist_id": artist_id},
+            lambda: self._spotify.artist(artist_id=artist_id),
+        )
 
     def search(
         self: "SpotifyClient", q: str, cat: str, limit: int, offset: int
@@ -45,7 +208,13 @@ class SpotifyClient:
         Returns:
             dict: The search results
         """
-        return self._spotify.search(q=q, type=cat, limit=limit, offset=offset)
+        return self._request(
+            "search",
+            {"q": q, "type": cat, "limit": limit, "offset": offset},
+            lambda: self._spotify.search(
+                q=q, type=cat, limit=limit, offset=offset
+            ),
+        )
 
     def artists(self: "SpotifyClient", artists: list) -> Any:
         """Gets artist information from Spotify API
@@ -57,7 +226,11 @@ class SpotifyClient:
         Returns:
             dict: Artist information
         """
-        return self._spotify.artists(artists=artists)
+        return self._request(
+            "artists",
+            {"artists": list(artists)},
+            lambda: self._spotify.artists(artists=artists),
+        )
 
     def artist_albums(
         self: "SpotifyClient",
@@ -79,11 +252,20 @@ class SpotifyClient:
         Returns:
             dict: The albums
         """
-        return self._spotify.artist_albums(
-            artist_id=artist_id,
-            album_type=album_type,
-            limit=limit,
-            offset=offset,
+        return self._request(
+            "artist_albums",
+            {
+                "artist_id": artist_id,
+                "album_type": album_type,
+                "limit": limit,
+                "offset": offset,
+            },
+            lambda: self._spotify.artist_albums(
+                artist_id=artist_id,
+                album_type=album_type,
+                limit=limit,
+                offset=offset,
+            ),
         )
 
     def album_tracks(
@@ -101,8 +283,12 @@ class SpotifyClient:
         Returns:
             dict: The tracks
         """
-        return self._spotify.album_tracks(
-            album_id=album_id, limit=limit, offset=offset
+        return self._request(
+            "album_tracks",
+            {"album_id": album_id, "limit": limit, "offset": offset},
+            lambda: self._spotify.album_tracks(
+                album_id=album_id, limit=limit, offset=offset
+            ),
         )
 
     def albums(self: "SpotifyClient", albums: list) -> Any:
@@ -115,4 +301,8 @@ class SpotifyClient:
         Returns:
             dict: Album information
         """
-        return self._spotify.albums(albums=albums)
+        return self._request(
+            "albums",
+            {"albums": list(albums)},
+            lambda: self._spotify.albums(albums=albums),
+        )
@@ -0,0 +1,75 @@
+import json
+import os
+
+# pads partial release dates so an album is only treated as old once its
+# whole release period is before the high-water mark
+DATE_PADDING = {"year": "-12-31", "month": "-31", "day": ""}
+
+
+def release_day(album: dict) -> str:
+    """Gets an album's release date as a comparable YYYY-MM-DD string
+
+    Args:
+        album (dict): The album, as returned by the Spotify API
+
+    Returns:
+        str: The release date, padded to the end of its precision
+    """
+    precision = album.get("release_date_precision", "day")
+    return album["release_date"] + DATE_PADDING.get(precision, "")
+
+
+class SyncState:
+    """Per-artist high-water marks of the latest release already scraped,
+    persisted as JSON so refreshes only fetch newer albums"""
+
+    def __init__(
+        self: "SyncState", path: str = "data/sync_state.json"
+    ) -> None:
+        self._path = path
+        self._marks = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self._marks = json.load(file)
+
+    def since(self: "SyncState", artist_id: str) -> str | None:
+        """Gets the high-water mark of an artist
+
+        Args:
+            self (SyncState): Instance of SyncState
+            artist_id (str): The artist id
+
+        Returns:
+            str | None: The latest release date scraped, or None if the
+            artist has not been synced
+        """
+        return self._marks.get(artist_id)
+
+    def update(self: "SyncState", artist_id: str, albums: list) -> None:
+        """Raises the high-water mark of an artist to its latest album
+
+        Args:
+            self (SyncState): Instance of SyncState
+            artist_id (str): The artist id
+            albums (list): The scraped albums
+        """
+        days = [
+            release_day(album) for album in albums if "release_date" in album
+        ]
+        if not days:
+            return
+        latest = max(days)
+        current = self._marks.get(artist_id)
+        if current is None or latest > current:
+            self._marks[artist_id] = latest
+
+    def save(self: "SyncState") -> None:
+        """Writes the high-water marks to disk atomically
+
+        Args:
+            self (SyncState): Instance of SyncState
+        """
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._marks, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._path)
@@ -0,0 +1,58 @@
+import random
+from hub_labels import HubLabels
+from path_engine import PathEngine
+
+
+def random_graph(seed: int, artist_count: int, track_count: int) -> tuple:
+    generator = random.Random(seed)
+    artists = [
+        {"id": f"artist{i}", "name": f"Artist {i}"}
+        for i in range(artist_count)
+    ]
+    tracks = [
+        {
+            "id": f"track{i}",
+            "name": f"Track {i}",
+            "artists": [
+                f"artist{j}"
+                for j in generator.sample(
+                    range(artist_count), generator.choice([2, 2, 3])
+                )
+            ],
+        }
+        for i in range(track_count)
+    ]
+    return artists, tracks
+
+
+def bfs_distances(engine: PathEngine, start: int) -> list:
+    distances = [None] * len(engine.artist_ids)
+    distances[start] = 0
+    queue = [start]
+    for artist in queue:
+        for edge in range(engine.offsets[artist], engine.offsets[artist + 1]):
+            other = engine.neighbors[edge]
+            if distances[other] is None:
+                distances[other] = distances[artist] + 1
+                queue.append(other)
+    return distances
+
+
+def test_updated_labels_match_bfs():
+    for seed in range(10):
+        artists, tracks = random_graph(seed, 250, 370)
+        labels = HubLabels.build(PathEngine.from_data(artists, tracks[:250]))
+        engine = PathEngine.from_data(artists, tracks)
+        assert labels.update(engine)
+        for start in range(len(artists)):
+            expected = bfs_distances(engine, start)
+            for end in range(len(artists)):
+                assert labels.distance(start, end) == expected[end]
+
+
+def test_update_rejects_rewritten_tracks():
+    artists, tracks = random_graph(0, 50, 80)
+    labels = HubLabels.build(PathEngine.from_data(artists, tracks))
+    assert not labels.update(PathEngine.from_data(artists, tracks[:40]))
+    tracks[-1] = dict(tracks[-1], id="replaced")
+    assert not labels.update(PathEngine.from_data(artists, tracks))
@@ -0,0 +1,89 @@
+from typing import Iterable
+
+
+class TrackFilter:
+    """Keeps the tracks that connect scraped artists, allowing only one
+    collaboration per artist pair. Membership checks go through hashed
+    indexes so each track costs time proportional to its own artists."""
+
+    def __init__(self: "TrackFilter", artist_ids: Iterable[str]) -> None:
+        self._artist_ids = set(artist_ids)
+        self._collabs = set()
+        self._track_ids = set()
+
+    def __len__(self: "TrackFilter") -> int:
+        return len(self._track_ids)
+
+    def accept(self: "TrackFilter", track: dict) -> dict | None:
+        """Filters a single scraped track
+
+        Args:
+            self (TrackFilter): Instance of TrackFilter
+            track (dict): The track, as returned by the Spotify API
+
+        Returns:
+            dict | None: The track record to keep, or None if it is dropped
+        """
+        track_id = track["id"]
+        if track_id in self._track_ids:
+            return None
+        included_artists = [
+            artist["id"]
+            for artist in track["artists"]
+            if artist["id"] in self._artist_ids
+        ]
+        if not self._add(track_id, included_artists):
+            return None
+        return {
+            "name": track["name"],
+            "id": track_id,
+            "artists": included_artists,
+        }
+
+    def seed(self: "TrackFilter", tracks: Iterable[dict]) -> None:
+        """Registers already filtered tracks, e.g. the ones in tracks.csv,
+        so that new tracks are filtered against them
+
+        Args:
+            self (TrackFilter): Instance of TrackFilter
+            tracks (Iterable[dict]): The filtered track records
+        """
+        for track in tracks:
+            self._track_ids.add(track["id"])
+            self._collabs.update(self._connections(track["artists"]))
+
+    def _add(self: "TrackFilter", track_id: str, artist_ids: list) -> bool:
+        """Registers a track if it adds only new collaborations
+
+        Args:
+            self (TrackFilter): Instance of TrackFilter
+            track_id (str): The track id
+            artist_ids (list): The ids of the track's scraped artists
+
+        Returns:
+            bool: Whether the track was kept
+        """
+        if len(artist_ids) < 2:
+            return False
+        track_conns = self._connections(artist_ids)
+        if not track_conns.isdisjoint(self._collabs):
+            return False
+        self._collabs.update(track_conns)
+        self._track_ids.add(track_id)
+        return True
+
+    @staticmethod
+    def _connections(artist_ids: list) -> set:
+        """Gets the artist pairs connected by a track
+
+        Args:
+            artist_ids (list): The ids of the track's artists
+
+        Returns:
+            set: The sorted artist id pairs
+        """
+        return {
+            (a, b) if a < b else (b, a)
+            for i, a in enumerate(artist_ids)
+            for b in artist_ids[i + 1 :]
+        }